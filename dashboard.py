@@ -1,5 +1,7 @@
+import os
 import sqlite3
 import pandas as pd
+import numpy as np
 import streamlit as st
 import altair as alt
 
@@ -8,17 +10,90 @@ DB_NAME = "nodehub.db"
 # -----------------------------------------
 # Load data from SQLite
 # -----------------------------------------
-@st.cache_data
-def load_data():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM peopleflowtotals", conn)
-    conn.close()
-    return df
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+    "temp_store=MEMORY",
+    "synchronous=NORMAL",
+)
 
-df = load_data()
+@st.cache_resource
+def get_connection():
+    # One connection per server process, shared by every loader and rerun
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+# Only the columns the page actually reads
+PEOPLEFLOW_COLUMNS = "created_at, total_inside, total_outside"
+
+def get_data_version():
+    # Freshness token for the disk-persisted loaders: changes on every insert
+    # (rowid) and on every committed write to the database files (mtime)
+    conn = get_connection()
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM peopleflowtotals").fetchone()[0]
+    mtimes = tuple(
+        os.path.getmtime(path)
+        for path in (DB_NAME, DB_NAME + "-wal")
+        if os.path.exists(path)
+    )
+    return max_rowid, mtimes
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_date_bounds(data_version):
+    conn = get_connection()
+    min_ts, max_ts = conn.execute(
+        "SELECT MIN(created_at), MAX(created_at) FROM peopleflowtotals"
+    ).fetchone()
+    return pd.Timestamp(min_ts).date(), pd.Timestamp(max_ts).date()
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_day_cameras(data_version, day):
+    start = pd.Timestamp(day)
+    end = start + pd.Timedelta(days=1)
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT DISTINCT camera_id FROM peopleflowtotals "
+        "WHERE created_at >= ? AND created_at < ? ORDER BY camera_id",
+        (str(start), str(end))
+    ).fetchall()
+    return [r[0] for r in rows]
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_range(data_version, start, end, cameras):
+    placeholders = ",".join("?" * len(cameras))
+    conn = get_connection()
+    df = pd.read_sql_query(
+        f"SELECT {PEOPLEFLOW_COLUMNS} FROM peopleflowtotals "
+        f"WHERE created_at >= ? AND created_at < ? AND camera_id IN ({placeholders})",
+        conn,
+        params=[str(start), str(end), *cameras],
+        parse_dates=["created_at"]
+    )
+    for col in ("total_inside", "total_outside"):
+        df[col] = pd.to_numeric(df[col], downcast="unsigned")
+    return df
 
-# Convert created_at to datetime
-df["created_at"] = pd.to_datetime(df["created_at"])
+@st.cache_resource
+def last_data_version():
+    # Server-wide record of the data version the persisted loaders were filled for
+    return {"version": None}
+
+def prune_stale_versions(data_version):
+    # A new data version makes every persisted entry stale: drop them from memory
+    # and from the on-disk cache instead of letting one file pile up per version
+    seen = last_data_version()
+    if seen["version"] is not None and seen["version"] != data_version:
+        load_date_bounds.clear()
+        load_day_cameras.clear()
+        load_range.clear()
+    seen["version"] = data_version
+
+data_version = get_data_version()
+prune_stale_versions(data_version)
+min_date, _ = load_date_bounds(data_version)
 
 # -----------------------------------------
 # Sidebar filters
@@ -28,36 +103,46 @@ st.sidebar.header("Filters")
 # Date selector
 selected_date = st.sidebar.date_input(
     "Select a date",
-    value=df["created_at"].dt.date.min()
+    value=min_date
 )
 
-# Filter by selected date
-df_day = df[df["created_at"].dt.date == selected_date]
-
 # Camera selector
-camera_list = sorted(df_day["camera_id"].unique())
+camera_list = load_day_cameras(data_version, selected_date)
 selected_camera = st.sidebar.selectbox("Select a camera", camera_list)
 
-# Filter by camera
-df_cam = df_day[df_day["camera_id"] == selected_camera].copy()
+# Filter by selected date and camera in SQL
+day_start = pd.Timestamp(selected_date)
+df_cam = load_range(data_version, day_start, day_start + pd.Timedelta(days=1), (selected_camera,))
 
 # -----------------------------------------
 # Aggregate per hour
 # -----------------------------------------
-df_cam["hour"] = df_cam["created_at"].dt.hour
-
-df_hourly = df_cam.groupby("hour").agg({
-    "total_inside": "sum",
-    "total_outside": "sum"
-}).reset_index()
-
-# Melt for chart
-df_melt = df_hourly.melt(
-    id_vars="hour",
-    value_vars=["total_inside", "total_outside"],
-    var_name="direction",
-    value_name="count"
+hours = df_cam["created_at"].values.astype("datetime64[h]").astype("int64") % 24
+
+# Bin straight into dense 24-slot arrays, then keep the hours that have records
+records_per_hour = np.bincount(hours, minlength=24)
+present_hours = np.flatnonzero(records_per_hour)
+hourly_sums = pd.DataFrame(
+    {
+        col: np.bincount(hours, weights=df_cam[col].to_numpy(), minlength=24)[present_hours].astype("int64")
+        for col in ("total_inside", "total_outside")
+    },
+    index=pd.Index(present_hours, name="hour")
 )
+df_hourly = hourly_sums.reset_index()
+
+# Long form for the chart, built directly from the two sum columns
+df_melt = pd.DataFrame({
+    "hour": np.tile(hourly_sums.index.to_numpy(), 2),
+    "direction": pd.Categorical(
+        np.repeat(["total_inside", "total_outside"], len(hourly_sums)),
+        categories=["total_inside", "total_outside"]
+    ),
+    "count": np.concatenate([
+        hourly_sums["total_inside"].to_numpy(),
+        hourly_sums["total_outside"].to_numpy()
+    ])
+})
 
 # -----------------------------------------
 # Dashboard Title
@@ -1,9 +1,11 @@
 import sqlite3
 import pandas as pd
+import numpy as np
 import streamlit as st
 import altair as alt
 from datetime import date
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import subprocess
 import os
 import sys
@@ -28,30 +30,261 @@ st.markdown("""
 # -------------------------------------------------------------------
 # Load peopleflowtotals
 # -------------------------------------------------------------------
-@st.cache_data
-def load_peopleflow():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM peopleflowtotals", conn)
-    conn.close()
-    df["created_at"] = pd.to_datetime(df["created_at"])
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+    "temp_store=MEMORY",
+    "synchronous=NORMAL",
+)
+
+@st.cache_resource
+def get_connection():
+    # One connection per server process, shared by every loader and rerun
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+def get_data_version():
+    # Freshness token for the disk-persisted loaders: changes on every insert
+    # (rowid) and on every committed write to the database files (mtime)
+    conn = get_connection()
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM peopleflowtotals").fetchone()[0]
+    mtimes = tuple(
+        os.path.getmtime(path)
+        for path in (DB_NAME, DB_NAME + "-wal")
+        if os.path.exists(path)
+    )
+    return max_rowid, mtimes
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_date_bounds(data_version):
+    conn = get_connection()
+    min_ts, max_ts = conn.execute(
+        "SELECT MIN(created_at), MAX(created_at) FROM peopleflowtotals"
+    ).fetchone()
+    if min_ts is None:
+        return None, None
+    return pd.Timestamp(min_ts).date(), pd.Timestamp(max_ts).date()
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_camera_ids(data_version, start, end):
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT DISTINCT camera_id FROM peopleflowtotals "
+        "WHERE created_at >= ? AND created_at < ? ORDER BY camera_id",
+        (str(start), str(end))
+    ).fetchall()
+    return [r[0] for r in rows]
+
+@st.cache_data(persist="disk", max_entries=4)
+def load_hourly_rollup(data_version, start, end, cameras, only_valid=False):
+    placeholders = ",".join("?" * len(cameras))
+    valid_clause = "AND valid = 1" if only_valid else ""
+    sql = f"""
+        SELECT camera_id,
+               date(created_at) AS date,
+               CAST(strftime('%H', created_at) AS INTEGER) AS hour,
+               SUM(total_inside) AS total_inside,
+               SUM(total_outside) AS total_outside
+        FROM peopleflowtotals
+        WHERE created_at >= ? AND created_at < ?
+          AND camera_id IN ({placeholders})
+          {valid_clause}
+        GROUP BY camera_id, date, hour
+    """
+    conn = get_connection()
+    df = pd.read_sql_query(
+        sql,
+        conn,
+        params=[str(start), str(end), *cameras],
+        parse_dates=["date"]
+    )
+    df["camera_id"] = df["camera_id"].astype("category")
+    df["hour"] = df["hour"].astype("int8")
+    for col in ("total_inside", "total_outside"):
+        df[col] = pd.to_numeric(df[col], downcast="unsigned")
     return df
 
-df_people = load_peopleflow()
+@st.cache_resource
+def last_data_version():
+    # Server-wide record of the data version the persisted loaders were filled for
+    return {"version": None}
+
+def prune_stale_versions(data_version):
+    # A new data version makes every persisted entry stale: drop them from memory
+    # and from the on-disk cache instead of letting one file pile up per version
+    seen = last_data_version()
+    if seen["version"] is not None and seen["version"] != data_version:
+        load_date_bounds.clear()
+        load_camera_ids.clear()
+        load_hourly_rollup.clear()
+    seen["version"] = data_version
+
+data_version = get_data_version()
+prune_stale_versions(data_version)
+min_date, max_date = load_date_bounds(data_version)
 
 # -------------------------------------------------------------------
 # Load login_camera
 # -------------------------------------------------------------------
 @st.cache_data
 def load_login_camera():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     df = pd.read_sql_query("SELECT * FROM login_camera", conn)
-    conn.close()
     df["pong_ts"] = pd.to_datetime(df["pong_ts"], errors="coerce")
     df["pong_ts_last_fail"] = pd.to_datetime(df["pong_ts_last_fail"], errors="coerce")
     return df
 
 df_login = load_login_camera()
 
+# -------------------------------------------------------------------
+# Chart helpers: inside/outside long form and hour labels
+# -------------------------------------------------------------------
+DIRECTIONS = ["total_inside", "total_outside"]
+
+def melt_directions(df, id_vars):
+    # Same layout as df.melt(id_vars, DIRECTIONS): all inside rows, then all outside rows
+    long_df = pd.DataFrame({col: np.tile(df[col].to_numpy(), 2) for col in id_vars})
+    long_df["direction"] = pd.Categorical(np.repeat(DIRECTIONS, len(df)), categories=DIRECTIONS)
+    long_df["count"] = np.concatenate([df[col].to_numpy() for col in DIRECTIONS])
+    return long_df
+
+HOUR_STR = np.array([f"{h:02d}:00" for h in range(24)])
+
+def hour_labels(df):
+    # "HH:00 (YYYY-MM-DD)": hours from a 24-entry lookup, each distinct date formatted once
+    date_codes, unique_dates = pd.factorize(df["date"])
+    date_str = unique_dates.strftime("%Y-%m-%d").to_numpy()[date_codes]
+    return pd.Series(HOUR_STR[df["hour"].to_numpy()], index=df.index) + " (" + date_str + ")"
+
+MAX_HOURLY_BARS = 500
+
+def direction_bar_chart(long_df):
+    # Beyond MAX_HOURLY_BARS rows the per-hour bars are unreadable and heavy
+    # to ship to the browser, so fall back to one bar per day
+    if len(long_df) > MAX_HOURLY_BARS:
+        data = (
+            long_df.groupby(["date", "direction"], observed=True)["count"]
+            .sum()
+            .reset_index()
+        )
+        x = alt.X("date:T", title="Date")
+        tooltip = ["date", "direction", "count"]
+    else:
+        data = long_df
+        x = alt.X("hour_label:N", title="Date & hour", sort=None)
+        tooltip = ["date", "hour", "direction", "count"]
+
+    return (
+        alt.Chart(data)
+        .mark_bar()
+        .encode(
+            x=x,
+            y=alt.Y("count:Q", title="People count"),
+            color=alt.Color("direction:N", title="Direction"),
+            tooltip=tooltip
+        )
+        .properties(height=400)
+    )
+
+# -------------------------------------------------------------------
+# Derived views, cached per (data_version, start, end, cameras, only_valid)
+# -------------------------------------------------------------------
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_hourly_combined(data_version, start, end, cameras, only_valid):
+    df = load_hourly_rollup(data_version, start, end, cameras, only_valid)
+    return (
+        df.groupby(["date", "hour"])
+        .agg(
+            total_inside=("total_inside", "sum"),
+            total_outside=("total_outside", "sum")
+        )
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_daily(data_version, start, end, cameras, only_valid):
+    # Roll up the (date, hour) totals rather than the per-camera rollup
+    hourly = compute_hourly_combined(data_version, start, end, cameras, only_valid)
+    return (
+        hourly.groupby("date")
+        .agg(
+            total_inside=("total_inside", "sum"),
+            total_outside=("total_outside", "sum")
+        )
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_camera_hour(data_version, start, end, cameras, only_valid):
+    df = load_hourly_rollup(data_version, start, end, cameras, only_valid)
+    return (
+        df.groupby(["camera_id", "hour"], observed=True)
+        .agg(total_flow=("total_inside", "sum"))
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_camera_hour_matrix(data_version, start, end, cameras, only_valid):
+    # Dense camera x hour matrix of inside flow, hours without data set to 0
+    camera_hour = compute_camera_hour(data_version, start, end, cameras, only_valid)
+    return camera_hour.set_index(["camera_id", "hour"])["total_flow"].unstack(fill_value=0)
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_peak(data_version, start, end, cameras, only_valid):
+    # Hours without data stay NaN here so they can never be picked as the peak
+    camera_hour = compute_camera_hour(data_version, start, end, cameras, only_valid)
+    matrix = camera_hour.set_index(["camera_id", "hour"])["total_flow"].unstack()
+    values = matrix.to_numpy(dtype=float)
+    peak_col = np.nanargmax(values, axis=1)
+    return pd.DataFrame({
+        "camera_id": matrix.index,
+        "hour": matrix.columns.to_numpy()[peak_col],
+        "total_flow": values[np.arange(len(values)), peak_col].astype(camera_hour["total_flow"].dtype)
+    })
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_clusters(data_version, start, end, cameras, only_valid):
+    pivot = compute_camera_hour_matrix(data_version, start, end, cameras, only_valid)
+
+    # Limit number of clusters to number of cameras
+    n_clusters = min(3, pivot.shape[0])
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=min(64, pivot.shape[0]),
+        n_init=3,
+        random_state=42
+    )
+    pivot["cluster"] = kmeans.fit_predict(pivot)
+
+    return pivot[["cluster"]].sort_values("cluster")
+
+@st.cache_data(max_entries=32, ttl=3600)
+def forecast_next_week(daily_flow):
+    # Holt-Winters with weekly seasonality once two full weeks are available,
+    # 3-day moving average before that
+    series = daily_flow.asfreq("D").interpolate()
+
+    if len(series) >= 14:
+        model = ExponentialSmoothing(
+            series,
+            trend="add",
+            damped_trend=True,
+            seasonal="add",
+            seasonal_periods=7
+        ).fit()
+        future_values = np.clip(model.forecast(7).to_numpy(), 0, None)
+    else:
+        future_values = np.full(7, series.rolling(window=3).mean().iloc[-1])
+
+    return pd.DataFrame({
+        "date": pd.date_range(series.index[-1] + pd.Timedelta(days=1), periods=7),
+        "forecast": future_values
+    })
+
 # -------------------------------------------------------------------
 # Tabs
 # -------------------------------------------------------------------
@@ -62,18 +295,13 @@ tab1, tab2, tab3, tab4, tab5= st.tabs(["📊 Analytics", "🛠 Camera Health", "
 # ===================================================================
 with tab1:
 
-    df = df_people.copy()
-
-    if df.empty:
+    if min_date is None:
         st.error("No data found in peopleflowtotals.")
         st.stop()
 
     # Sidebar filters
     st.sidebar.title("Filters")
 
-    min_date = df["created_at"].dt.date.min()
-    max_date = df["created_at"].dt.date.max()
-
     date_range = st.sidebar.date_input(
         "Select date range",
         value=(min_date, max_date),
@@ -89,14 +317,15 @@ with tab1:
         else:
             start_date, end_date = date_range
 
-    mask_date = (df["created_at"].dt.date >= start_date) & (df["created_at"].dt.date <= end_date)
-    df = df[mask_date]
+    start_ts = pd.Timestamp(start_date)
+    end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
 
-    if df.empty:
+    camera_ids = load_camera_ids(data_version, start_ts, end_ts)
+
+    if not camera_ids:
         st.warning("No data for the selected date range.")
         st.stop()
 
-    camera_ids = sorted(df["camera_id"].unique())
     selected_cameras = st.sidebar.multiselect(
         "Select cameras",
         options=camera_ids,
@@ -107,19 +336,16 @@ with tab1:
         st.warning("Please select at least one camera.")
         st.stop()
 
-    df = df[df["camera_id"].isin(selected_cameras)]
-
     only_valid = st.sidebar.checkbox("Only valid records (valid = 1)", value=True)
-    if only_valid:
-        df = df[df["valid"] == 1]
+
+    # One row per (camera, date, hour); every view below re-aggregates this
+    filter_key = (data_version, start_ts, end_ts, tuple(selected_cameras), only_valid)
+    df = load_hourly_rollup(*filter_key)
 
     if df.empty:
         st.warning("No data after applying filters.")
         st.stop()
 
-    df["date"] = df["created_at"].dt.date
-    df["hour"] = df["created_at"].dt.hour
-
     st.title("📊 People Flow Analytics")
 
     st.caption(
@@ -152,30 +378,15 @@ with tab1:
         index=0
     )
 
-    df_detail = df[df["camera_id"] == camera_for_detail].copy()
-    df_detail["hour_label"] = (
-        df_detail["hour"].astype(str).str.zfill(2)
-        + ":00 (" + df_detail["date"].astype(str) + ")"
-    )
+    df_detail = df.loc[
+        df["camera_id"] == camera_for_detail,
+        ["date", "hour", "total_inside", "total_outside"]
+    ]
+    df_detail = df_detail.assign(hour_label=hour_labels(df_detail))
 
-    melt_detail = df_detail.melt(
-        id_vars=["hour_label", "hour", "date"],
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
+    melt_detail = melt_directions(df_detail, ["hour_label", "hour", "date"])
 
-    chart_detail = (
-        alt.Chart(melt_detail)
-        .mark_bar()
-        .encode(
-            x=alt.X("hour_label:N", title="Date & hour", sort=None),
-            y=alt.Y("count:Q", title="People count"),
-            color=alt.Color("direction:N", title="Direction"),
-            tooltip=["date", "hour", "direction", "count"]
-        )
-        .properties(height=400)
-    )
+    chart_detail = direction_bar_chart(melt_detail)
 
     st.altair_chart(chart_detail, width="stretch")
 
@@ -184,38 +395,13 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("Hourly flow (all selected cameras combined)")
 
-    grouped_all = (
-        df.groupby(["date", "hour"])
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
+    grouped_all = compute_hourly_combined(*filter_key)
 
-    grouped_all["hour_label"] = (
-        grouped_all["hour"].astype(str).str.zfill(2)
-        + ":00 (" + grouped_all["date"].astype(str) + ")"
-    )
+    grouped_all["hour_label"] = hour_labels(grouped_all)
 
-    melt_all = grouped_all.melt(
-        id_vars=["hour_label", "hour", "date"],
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
+    melt_all = melt_directions(grouped_all, ["hour_label", "hour", "date"])
 
-    chart_all = (
-        alt.Chart(melt_all)
-        .mark_bar()
-        .encode(
-            x=alt.X("hour_label:N", title="Date & hour", sort=None),
-            y=alt.Y("count:Q", title="People count"),
-            color=alt.Color("direction:N", title="Direction"),
-            tooltip=["date", "hour", "direction", "count"]
-        )
-        .properties(height=400)
-    )
+    chart_all = direction_bar_chart(melt_all)
 
     st.altair_chart(chart_all, width="stretch")
 
@@ -224,11 +410,7 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("Heatmap — Flow intensity by camera and hour")
 
-    heatmap_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
+    heatmap_df = compute_camera_hour(*filter_key)
 
     heatmap_chart = (
         alt.Chart(heatmap_df)
@@ -249,21 +431,9 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("Daily totals — Inside vs Outside")
 
-    daily_df = (
-        df.groupby("date")
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
+    daily_df = compute_daily(*filter_key)
 
-    daily_melt = daily_df.melt(
-        id_vars="date",
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
+    daily_melt = melt_directions(daily_df, ["date"])
 
     daily_chart = (
         alt.Chart(daily_melt)
@@ -284,14 +454,7 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("Peak hour per camera")
 
-    peak_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
-
-    peak_idx = peak_df.groupby("camera_id")["total_flow"].idxmax()
-    peak_hours = peak_df.loc[peak_idx].sort_values("camera_id")
+    peak_hours = compute_peak(*filter_key)
 
     st.dataframe(peak_hours)
 
@@ -300,11 +463,7 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("Camera comparison — Total flow per hour")
 
-    compare_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
+    compare_df = compute_camera_hour(*filter_key)
 
     compare_chart = (
         alt.Chart(compare_df)
@@ -325,47 +484,31 @@ with tab1:
     # ----------------------------------------------------------------
     st.subheader("⚠️ Anomaly Detection (Daily Inside Flow)")
 
-    if daily_df["total_inside"].std() == 0 or len(daily_df) < 5:
+    inside_vals = daily_df["total_inside"].to_numpy(dtype="float64")
+    inside_std = inside_vals.std(ddof=1) if len(inside_vals) >= 5 else 0.0
+
+    if inside_std == 0:
         st.info("Not enough variation in data to detect anomalies.")
     else:
-        daily_df["zscore"] = (
-            (daily_df["total_inside"] - daily_df["total_inside"].mean())
-            / daily_df["total_inside"].std()
-        )
+        zscore = (inside_vals - inside_vals.mean()) / inside_std
+        anomaly_pos = np.flatnonzero(np.abs(zscore) > 2)
 
-        anomalies = daily_df[daily_df["zscore"].abs() > 2]
-
-        if anomalies.empty:
+        if len(anomaly_pos) == 0:
             st.success("No anomalies detected in the selected period.")
         else:
+            anomalies = daily_df.iloc[anomaly_pos][["date", "total_inside"]].assign(
+                zscore=zscore[anomaly_pos]
+            )
             st.error(f"{len(anomalies)} anomaly day(s) detected")
-            st.dataframe(anomalies[["date", "total_inside", "zscore"]])
+            st.dataframe(anomalies)
 
     # ----------------------------------------------------------------
     # STEP 4 — Camera behavior clustering (K-Means)
     # ----------------------------------------------------------------
     st.subheader("🎯 Camera Behavior Clustering (Hourly Pattern)")
 
-    cluster_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
-
-    if cluster_df["camera_id"].nunique() >= 3:
-        pivot = cluster_df.pivot(
-            index="camera_id",
-            columns="hour",
-            values="total_flow"
-        ).fillna(0)
-
-        # Limit number of clusters to number of cameras
-        n_clusters = min(3, pivot.shape[0])
-
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init="auto")
-        pivot["cluster"] = kmeans.fit_predict(pivot)
-
-        st.dataframe(pivot[["cluster"]].sort_values("cluster"))
+    if df["camera_id"].nunique() >= 3:
+        st.dataframe(compute_clusters(*filter_key))
     else:
         st.info("Need at least 3 cameras to perform clustering.")
 
@@ -381,20 +524,21 @@ with tab2:
     freshness_minutes = 5
     threshold = now - pd.Timedelta(minutes=freshness_minutes)
 
-    df_login_display = df_login.copy()
-
-    df_login_display["status"] = df_login_display["pong_ts"].apply(
-        lambda ts: "🟢 Online" if pd.notnull(ts) and ts >= threshold else "🔴 Offline"
-    )
+    online_mask = (df_login["pong_ts"].notna() & (df_login["pong_ts"] >= threshold)).to_numpy()
 
-    df_login_display["last_seen"] = df_login_display["pong_ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
-    df_login_display["last_fail"] = df_login_display["pong_ts_last_fail"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    # Only the displayed columns; df_login itself is left untouched for the raw data tab
+    df_login_display = pd.DataFrame({
+        "id": df_login["id"],
+        "location": df_login["location"],
+        "status": np.where(online_mask, "🟢 Online", "🔴 Offline"),
+        "last_seen": df_login["pong_ts"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "last_fail": df_login["pong_ts_last_fail"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    })
 
     st.subheader("Camera Status Overview")
 
     st.dataframe(
-        df_login_display[["id", "location", "status", "last_seen", "last_fail"]]
-        .sort_values("id"),
+        df_login_display.sort_values("id"),
         width="stretch"
     )
 
@@ -404,9 +548,12 @@ with tab2:
         st.error(f"{len(offline)} camera(s) offline")
         st.dataframe(offline[["id", "location", "last_seen"]])
 
+    # Deferred: the CSV is only serialized when the button is clicked
     st.download_button(
         "Download Camera Health CSV",
-        df_login_display.to_csv(index=False),
+        lambda login=df_login, display=df_login_display: pd.concat(
+            [login, display[["status", "last_seen", "last_fail"]]], axis=1
+        ).to_csv(index=False).encode(),
         "camera_health.csv",
         "text/csv"
     )
@@ -420,17 +567,14 @@ with tab3:
 
     st.subheader("Peopleflow Aggregated Data (per camera, date, hour)")
 
-    df = df_people.copy()
-    df["date"] = df["created_at"].dt.date
-    df["hour"] = df["created_at"].dt.hour
+    all_start_ts = pd.Timestamp(min_date)
+    all_end_ts = pd.Timestamp(max_date) + pd.Timedelta(days=1)
 
-    grouped = (
-        df.groupby(["camera_id", "date", "hour"])
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
+    grouped = load_hourly_rollup(
+        data_version,
+        all_start_ts,
+        all_end_ts,
+        tuple(load_camera_ids(data_version, all_start_ts, all_end_ts))
     )
 
     st.dataframe(grouped.sort_values(["camera_id", "date", "hour"]))
@@ -445,29 +589,18 @@ with tab3:
 with tab4:
 
     # ----------------------------------------------------------------
-    # STEP 4 — Forecasting (moving average)
+    # STEP 4 — Forecasting (Holt-Winters exponential smoothing)
     # ----------------------------------------------------------------
-    st.subheader("📈 Forecast — Next 7 Days (Moving Average) must be improved")
+    st.subheader("📈 Forecast — Next 7 Days (Holt-Winters, weekly seasonality)")
     
     forecast_df = (
-        df.groupby("date")
+        grouped.groupby("date")
         .agg(total_flow=("total_inside", "sum"))
         .reset_index()
     ).sort_values("date")
 
     if len(forecast_df) >= 3:
-        forecast_df["ma3"] = forecast_df["total_flow"].rolling(window=3).mean()
-
-        last_date = forecast_df["date"].max()
-        future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=7)
-
-        last_ma = forecast_df["ma3"].iloc[-1]
-        future_values = [last_ma] * 7
-
-        future_df = pd.DataFrame({
-            "date": future_dates,
-            "forecast": future_values
-        })
+        future_df = forecast_next_week(forecast_df.set_index("date")["total_flow"])
 
         chart_forecast = (
             alt.Chart(forecast_df)
@@ -511,19 +644,31 @@ with tab5:
         """Run a Python script inside the simulate/ folder with optional arguments."""
         script_path = os.path.join("simulate", script_name)
 
-        cmd = [sys.executable, script_path]
+        # -u: unbuffered child stdout, so lines reach the pipe as they are printed
+        cmd = [sys.executable, "-u", script_path]
 
         if args:
             cmd.extend(args)
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
         st.subheader("Output")
-        if result.stdout:
-            st.code(result.stdout)
+        placeholder = st.empty()
+        lines = []
+
+        # Stream the child's output as it runs; stderr is merged into stdout
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        for line in proc.stdout:
+            lines.append(line)
+            placeholder.code("".join(lines[-200:]))
+        proc.wait()
 
-        if result.stderr:
-            st.error(result.stderr)
+        if proc.returncode != 0:
+            st.error(f"{script_name} exited with code {proc.returncode}")
 
     # ---------------------------------------------------------
     # 1. SIMULATE ANOMALY
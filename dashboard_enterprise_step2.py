@@ -1,36 +1,38 @@
-import sqlite3
 import pandas as pd
 import streamlit as st
 import altair as alt
 from datetime import date
+from pipeline import (
+    DIRECTIONS,
+    compute_camera_hour,
+    compute_daily,
+    compute_hourly_combined,
+    compute_peak,
+    direction_bar_chart,
+    get_connection,
+    load_camera_ids,
+    load_peopleflow_filtered,
+    load_peopleflow_meta,
+    melt_directions,
+)
 
 st.set_page_config(layout="wide")
 
-DB_NAME = "nodehub.db"
-
 # -----------------------------------------
 # Load data from SQLite
 # -----------------------------------------
-@st.cache_data
-
-def load_peopleflow():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM peopleflowtotals", conn)
-    conn.close()
-    df["created_at"] = pd.to_datetime(df["created_at"])
-    return df
-
+@st.cache_data(ttl=30, show_spinner=False)
 def load_login_camera():
-    conn = sqlite3.connect(DB_NAME)
-    df1 = pd.read_sql_query("SELECT * FROM login_camera", conn)
-    conn.close()
+    conn = get_connection()
+    # Arrow-backed columns: text fields are stored as Arrow strings, not Python objects
+    df1 = pd.read_sql_query("SELECT * FROM login_camera", conn, dtype_backend="pyarrow")
     df1["pong_ts"] = pd.to_datetime(df1["pong_ts"])
     df1["pong_ts_last_fail"] = pd.to_datetime(df1["pong_ts_last_fail"])
     return df1
 
-df = load_peopleflow()
+min_date, max_date = load_peopleflow_meta()
 
-if df.empty:
+if min_date is None:
     st.error("No data found in peopleflowtotals.")
     st.stop()
 
@@ -46,9 +48,6 @@ if df1.empty:
 # -----------------------------------------
 st.sidebar.title("Filters")
 
-min_date = df["created_at"].dt.date.min()
-max_date = df["created_at"].dt.date.max()
-
 date_range = st.sidebar.date_input(
     "Select date range",
     value=(min_date, max_date),
@@ -65,15 +64,13 @@ else:
     else:
         start_date, end_date = date_range
 
-mask_date = (df["created_at"].dt.date >= start_date) & (df["created_at"].dt.date <= end_date)
-df = df[mask_date]
+# Camera filter
+camera_ids = load_camera_ids(start_date, end_date)
 
-if df.empty:
+if not camera_ids:
     st.warning("No data for the selected date range.")
     st.stop()
 
-# Camera filter
-camera_ids = sorted(df["camera_id"].unique())
 selected_cameras = st.sidebar.multiselect(
     "Select cameras",
     options=camera_ids,
@@ -84,23 +81,16 @@ if not selected_cameras:
     st.warning("Please select at least one camera.")
     st.stop()
 
-df = df[df["camera_id"].isin(selected_cameras)]
-
 # Valid filter
 only_valid = st.sidebar.checkbox("Only valid records (valid = 1)", value=True)
-if only_valid:
-    df = df[df["valid"] == 1]
 
-if df.empty:
+filter_key = (start_date, end_date, tuple(selected_cameras), only_valid)
+df_cube = load_peopleflow_filtered(*filter_key)
+
+if df_cube.empty:
     st.warning("No data after applying filters.")
     st.stop()
 
-# -----------------------------------------
-# Feature engineering
-# -----------------------------------------
-df["date"] = df["created_at"].dt.date
-df["hour"] = df["created_at"].dt.hour
-
 # -----------------------------------------
 # Layout – title
 # -----------------------------------------
@@ -114,10 +104,10 @@ st.caption(
 # -----------------------------------------
 # Summary metrics
 # -----------------------------------------
-total_inside = int(df["total_inside"].sum())
-total_outside = int(df["total_outside"].sum())
-num_cameras = df["camera_id"].nunique()
-num_days = df["date"].nunique()
+total_inside = int(df_cube["total_inside"].sum())
+total_outside = int(df_cube["total_outside"].sum())
+num_cameras = df_cube["camera_id"].nunique()
+num_days = df_cube["date"].nunique()
 
 col1, col2, col3, col4 = st.columns(4)
 col1.metric("Total inside", total_inside)
@@ -132,31 +122,14 @@ st.subheader("Hourly flow per camera")
 
 camera_for_detail = st.selectbox(
     "Select camera for detailed view",
-    sorted(df["camera_id"].unique()),
+    df_cube["camera_id"].unique().tolist(),
     index=0
 )
 
-df_detail = df[df["camera_id"] == camera_for_detail].copy()
-df_detail["hour_label"] = df_detail["hour"].astype(str).str.zfill(2) + ":00 (" + df_detail["date"].astype(str) + ")"
-
-melt_detail = df_detail.melt(
-    id_vars=["hour_label", "hour", "date"],
-    value_vars=["total_inside", "total_outside"],
-    var_name="direction",
-    value_name="count"
-)
+df_detail = df_cube.loc[df_cube["camera_id"] == camera_for_detail, ["ts_hour", *DIRECTIONS]]
+melt_detail = melt_directions(df_detail, ["ts_hour"])
 
-chart_detail = (
-    alt.Chart(melt_detail)
-    .mark_bar()
-    .encode(
-        x=alt.X("hour_label:N", title="Date & hour", sort=None),
-        y=alt.Y("count:Q", title="People count"),
-        color=alt.Color("direction:N", title="Direction"),
-        tooltip=["date", "hour", "direction", "count"]
-    )
-    .properties(height=400)
-)
+chart_detail = direction_bar_chart(melt_detail)
 
 st.altair_chart(chart_detail, width="stretch")
 
@@ -165,35 +138,11 @@ st.altair_chart(chart_detail, width="stretch")
 # -----------------------------------------
 st.subheader("Hourly flow (all selected cameras combined)")
 
-grouped_all = (
-    df.groupby(["date", "hour"])
-    .agg(
-        total_inside=("total_inside", "sum"),
-        total_outside=("total_outside", "sum")
-    )
-    .reset_index()
-)
+grouped_all = compute_hourly_combined(*filter_key)
 
-grouped_all["hour_label"] = grouped_all["hour"].astype(str).str.zfill(2) + ":00 (" + grouped_all["date"].astype(str) + ")"
+melt_all = melt_directions(grouped_all, ["ts_hour"])
 
-melt_all = grouped_all.melt(
-    id_vars=["hour_label", "hour", "date"],
-    value_vars=["total_inside", "total_outside"],
-    var_name="direction",
-    value_name="count"
-)
-
-chart_all = (
-    alt.Chart(melt_all)
-    .mark_bar()
-    .encode(
-        x=alt.X("hour_label:N", title="Date & hour", sort=None),
-        y=alt.Y("count:Q", title="People count"),
-        color=alt.Color("direction:N", title="Direction"),
-        tooltip=["date", "hour", "direction", "count"]
-    )
-    .properties(height=400)
-)
+chart_all = direction_bar_chart(melt_all)
 
 st.altair_chart(chart_all, width="stretch")
 
@@ -202,14 +151,10 @@ st.altair_chart(chart_all, width="stretch")
 # -----------------------------------------
 st.subheader("Heatmap — Flow intensity by camera and hour")
 
-heatmap_df = (
-    df.groupby(["camera_id", "hour"])
-    .agg(total_flow=("total_inside", "sum"))
-    .reset_index()
-)
+cam_hour = compute_camera_hour(*filter_key)
 
 heatmap_chart = (
-    alt.Chart(heatmap_df)
+    alt.Chart(cam_hour)
     .mark_rect()
     .encode(
         x=alt.X("hour:O", title="Hour of Day"),
@@ -227,21 +172,9 @@ st.altair_chart(heatmap_chart, width="stretch")
 # -----------------------------------------
 st.subheader("Daily totals — Inside vs Outside")
 
-daily_df = (
-    df.groupby("date")
-    .agg(
-        total_inside=("total_inside", "sum"),
-        total_outside=("total_outside", "sum")
-    )
-    .reset_index()
-)
+daily_df = compute_daily(*filter_key)
 
-daily_melt = daily_df.melt(
-    id_vars="date",
-    value_vars=["total_inside", "total_outside"],
-    var_name="direction",
-    value_name="count"
-)
+daily_melt = melt_directions(daily_df, ["date"])
 
 daily_chart = (
     alt.Chart(daily_melt)
@@ -262,14 +195,7 @@ st.altair_chart(daily_chart, width="stretch")
 # -----------------------------------------
 st.subheader("Peak hour per camera")
 
-peak_df = (
-    df.groupby(["camera_id", "hour"])
-    .agg(total_flow=("total_inside", "sum"))
-    .reset_index()
-)
-
-peak_idx = peak_df.groupby("camera_id")["total_flow"].idxmax()
-peak_hours = peak_df.loc[peak_idx].sort_values("camera_id")
+peak_hours = compute_peak(*filter_key)
 
 st.dataframe(peak_hours)
 
@@ -278,14 +204,8 @@ st.dataframe(peak_hours)
 # -----------------------------------------
 st.subheader("Camera comparison — Total flow per hour")
 
-compare_df = (
-    df.groupby(["camera_id", "hour"])
-    .agg(total_flow=("total_inside", "sum"))
-    .reset_index()
-)
-
 compare_chart = (
-    alt.Chart(compare_df)
+    alt.Chart(cam_hour)
     .mark_line(point=True)
     .encode(
         x=alt.X("hour:O", title="Hour of Day"),
@@ -302,15 +222,7 @@ st.altair_chart(compare_chart, width="stretch")
 # RAW DATA VIEW
 # -----------------------------------------
 with st.expander("Show aggregated data (per camera, per date, per hour)"):
-    grouped = (
-        df.groupby(["camera_id", "date", "hour"])
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
-    st.dataframe(grouped.sort_values(["camera_id", "date", "hour"]))
+    st.dataframe(df_cube)
     
     
 with st.expander("Show login_camera data)"):
@@ -1,38 +1,46 @@
-import sqlite3
+import io
 import pandas as pd
+import numpy as np
 import streamlit as st
 import altair as alt
 from datetime import date
+from pipeline import (
+    DIRECTIONS,
+    compute_camera_hour,
+    compute_daily,
+    compute_hourly_combined,
+    compute_peak,
+    direction_bar_chart,
+    get_connection,
+    load_camera_ids,
+    load_peopleflow_filtered,
+    load_peopleflow_meta,
+    melt_directions,
+)
 
 st.set_page_config(layout="wide")
 
-DB_NAME = "nodehub.db"
-
-# -----------------------------------------
-# Load peopleflowtotals
-# -----------------------------------------
-@st.cache_data
-def load_peopleflow():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM peopleflowtotals", conn)
-    conn.close()
-    df["created_at"] = pd.to_datetime(df["created_at"])
-    return df
-
-df = load_peopleflow()
+min_date, max_date = load_peopleflow_meta()
 
 # -----------------------------------------
 # Load login_camera
 # -----------------------------------------
-@st.cache_data
+@st.cache_data(ttl=30, show_spinner=False)
 def load_login_camera():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM login_camera", conn)
-    conn.close()
+    conn = get_connection()
+    # Arrow-backed columns: text fields are stored as Arrow strings, not Python objects
+    df = pd.read_sql_query("SELECT * FROM login_camera", conn, dtype_backend="pyarrow")
     df["pong_ts"] = pd.to_datetime(df["pong_ts"], errors="coerce")
     df["pong_ts_last_fail"] = pd.to_datetime(df["pong_ts_last_fail"], errors="coerce")
     return df
 
+@st.cache_data(ttl=30, show_spinner=False)
+def csv_bytes(df):
+    # Serialized once per distinct frame, written straight into a bytes buffer
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue()
+
 df_login = load_login_camera()
 
 # -----------------------------------------
@@ -45,16 +53,13 @@ tab1, tab2, tab3 = st.tabs(["📊 Analytics", "🛠 Camera Health", "📄 Raw Da
 # =====================================================================
 with tab1:
 
-    if df.empty:
+    if min_date is None:
         st.error("No data found in peopleflowtotals.")
         st.stop()
 
     # Sidebar filters
     st.sidebar.title("Filters")
 
-    min_date = df["created_at"].dt.date.min()
-    max_date = df["created_at"].dt.date.max()
-
     date_range = st.sidebar.date_input(
         "Select date range",
         value=(min_date, max_date),
@@ -70,14 +75,12 @@ with tab1:
         else:
             start_date, end_date = date_range
 
-    mask_date = (df["created_at"].dt.date >= start_date) & (df["created_at"].dt.date <= end_date)
-    df = df[mask_date]
+    camera_ids = load_camera_ids(start_date, end_date)
 
-    if df.empty:
+    if not camera_ids:
         st.warning("No data for the selected date range.")
         st.stop()
 
-    camera_ids = sorted(df["camera_id"].unique())
     selected_cameras = st.sidebar.multiselect(
         "Select cameras",
         options=camera_ids,
@@ -88,19 +91,15 @@ with tab1:
         st.warning("Please select at least one camera.")
         st.stop()
 
-    df = df[df["camera_id"].isin(selected_cameras)]
-
     only_valid = st.sidebar.checkbox("Only valid records (valid = 1)", value=True)
-    if only_valid:
-        df = df[df["valid"] == 1]
 
-    if df.empty:
+    filter_key = (start_date, end_date, tuple(selected_cameras), only_valid)
+    df_cube = load_peopleflow_filtered(*filter_key)
+
+    if df_cube.empty:
         st.warning("No data after applying filters.")
         st.stop()
 
-    df["date"] = df["created_at"].dt.date
-    df["hour"] = df["created_at"].dt.hour
-
     st.title("📊 People Flow Analytics")
 
     st.caption(
@@ -109,10 +108,10 @@ with tab1:
     )
 
     # Summary metrics
-    total_inside = int(df["total_inside"].sum())
-    total_outside = int(df["total_outside"].sum())
-    num_cameras = df["camera_id"].nunique()
-    num_days = df["date"].nunique()
+    total_inside = int(df_cube["total_inside"].sum())
+    total_outside = int(df_cube["total_outside"].sum())
+    num_cameras = df_cube["camera_id"].nunique()
+    num_days = df_cube["date"].nunique()
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total inside", total_inside)
@@ -125,80 +124,35 @@ with tab1:
 
     camera_for_detail = st.selectbox(
         "Select camera for detailed view",
-        sorted(df["camera_id"].unique()),
+        df_cube["camera_id"].unique().tolist(),
         index=0
     )
 
-    df_detail = df[df["camera_id"] == camera_for_detail].copy()
-    df_detail["hour_label"] = df_detail["hour"].astype(str).str.zfill(2) + ":00 (" + df_detail["date"].astype(str) + ")"
+    df_detail = df_cube.loc[df_cube["camera_id"] == camera_for_detail, ["ts_hour", *DIRECTIONS]]
+    melt_detail = melt_directions(df_detail, ["ts_hour"])
 
-    melt_detail = df_detail.melt(
-        id_vars=["hour_label", "hour", "date"],
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
-
-    chart_detail = (
-        alt.Chart(melt_detail)
-        .mark_bar()
-        .encode(
-            x=alt.X("hour_label:N", title="Date & hour", sort=None),
-            y=alt.Y("count:Q", title="People count"),
-            color=alt.Color("direction:N", title="Direction"),
-            tooltip=["date", "hour", "direction", "count"]
-        )
-        .properties(height=400)
-    )
+    chart_detail = direction_bar_chart(melt_detail)
 
     st.altair_chart(chart_detail, width="stretch")
 
     # Combined hourly flow
     st.subheader("Hourly flow (all selected cameras combined)")
 
-    grouped_all = (
-        df.groupby(["date", "hour"])
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
+    grouped_all = compute_hourly_combined(*filter_key)
 
-    grouped_all["hour_label"] = grouped_all["hour"].astype(str).str.zfill(2) + ":00 (" + grouped_all["date"].astype(str) + ")"
+    melt_all = melt_directions(grouped_all, ["ts_hour"])
 
-    melt_all = grouped_all.melt(
-        id_vars=["hour_label", "hour", "date"],
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
-
-    chart_all = (
-        alt.Chart(melt_all)
-        .mark_bar()
-        .encode(
-            x=alt.X("hour_label:N", title="Date & hour", sort=None),
-            y=alt.Y("count:Q", title="People count"),
-            color=alt.Color("direction:N", title="Direction"),
-            tooltip=["date", "hour", "direction", "count"]
-        )
-        .properties(height=400)
-    )
+    chart_all = direction_bar_chart(melt_all)
 
     st.altair_chart(chart_all, width="stretch")
 
     # Heatmap
     st.subheader("Heatmap — Flow intensity by camera and hour")
 
-    heatmap_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
+    cam_hour = compute_camera_hour(*filter_key)
 
     heatmap_chart = (
-        alt.Chart(heatmap_df)
+        alt.Chart(cam_hour)
         .mark_rect()
         .encode(
             x=alt.X("hour:O", title="Hour of Day"),
@@ -214,21 +168,9 @@ with tab1:
     # Daily totals
     st.subheader("Daily totals — Inside vs Outside")
 
-    daily_df = (
-        df.groupby("date")
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
+    daily_df = compute_daily(*filter_key)
 
-    daily_melt = daily_df.melt(
-        id_vars="date",
-        value_vars=["total_inside", "total_outside"],
-        var_name="direction",
-        value_name="count"
-    )
+    daily_melt = melt_directions(daily_df, ["date"])
 
     daily_chart = (
         alt.Chart(daily_melt)
@@ -247,28 +189,15 @@ with tab1:
     # Peak hour detection
     st.subheader("Peak hour per camera")
 
-    peak_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
-
-    peak_idx = peak_df.groupby("camera_id")["total_flow"].idxmax()
-    peak_hours = peak_df.loc[peak_idx].sort_values("camera_id")
+    peak_hours = compute_peak(*filter_key)
 
     st.dataframe(peak_hours)
 
     # Multi-camera comparison
     st.subheader("Camera comparison — Total flow per hour")
 
-    compare_df = (
-        df.groupby(["camera_id", "hour"])
-        .agg(total_flow=("total_inside", "sum"))
-        .reset_index()
-    )
-
     compare_chart = (
-        alt.Chart(compare_df)
+        alt.Chart(cam_hour)
         .mark_line(point=True)
         .encode(
             x=alt.X("hour:O", title="Hour of Day"),
@@ -293,9 +222,9 @@ with tab2:
     freshness_minutes = 5
     threshold = now - pd.Timedelta(minutes=freshness_minutes)
 
-    df_login["status"] = df_login["pong_ts"].apply(
-        lambda ts: "🟢 Online" if pd.notnull(ts) and ts >= threshold else "🔴 Offline"
-    )
+    # NaT compares False, so cameras that never ponged count as offline
+    online_mask = df_login["pong_ts"].ge(threshold).to_numpy()
+    df_login["status"] = np.where(online_mask, "🟢 Online", "🔴 Offline")
 
     df_login["last_seen"] = df_login["pong_ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
     df_login["last_fail"] = df_login["pong_ts_last_fail"].dt.strftime("%Y-%m-%d %H:%M:%S")
@@ -308,15 +237,15 @@ with tab2:
         use_container_width=True
     )
 
-    offline = df_login[df_login["status"] == "🔴 Offline"]
+    n_offline = int((~online_mask).sum())
 
-    if not offline.empty:
-        st.error(f"{len(offline)} camera(s) offline")
-        st.dataframe(offline[["id", "location", "last_seen"]])
+    if n_offline:
+        st.error(f"{n_offline} camera(s) offline")
+        st.dataframe(df_login.loc[~online_mask, ["id", "location", "last_seen"]])
 
     st.download_button(
         "Download Camera Health CSV",
-        df_login.to_csv(index=False),
+        csv_bytes(df_login),
         "camera_health.csv",
         "text/csv"
     )
@@ -329,15 +258,7 @@ with tab3:
     st.title("📄 Raw Data Explorer")
 
     st.subheader("Peopleflow Aggregated Data")
-    grouped = (
-        df.groupby(["camera_id", "date", "hour"])
-        .agg(
-            total_inside=("total_inside", "sum"),
-            total_outside=("total_outside", "sum")
-        )
-        .reset_index()
-    )
-    st.dataframe(grouped.sort_values(["camera_id", "date", "hour"]))
+    st.dataframe(df_cube)
 
     st.subheader("Login Camera Table")
     st.dataframe(df_login)
\ No newline at end of file
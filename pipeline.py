@@ -0,0 +1,175 @@
+# Data loading and derived views shared by dashboard_enterprise_step2.py and
+# dashboard_enterprise_step3.py. Every loader and view is cached on the sidebar
+# filters, so reruns (widget ticks, tab switches) only redraw the charts.
+
+import sqlite3
+import pandas as pd
+import numpy as np
+import streamlit as st
+import altair as alt
+
+DB_NAME = "nodehub.db"
+
+# -----------------------------------------
+# Load data from SQLite
+# -----------------------------------------
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "query_only=ON",
+)
+
+@st.cache_resource
+def get_connection():
+    # One read-only connection per server process, shared by every loader and rerun
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+def date_bounds(start_date, end_date):
+    # Half-open [start, end + 1 day) range, compared as strings by SQLite
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    return str(start), str(end)
+
+# Loaders share the views' bounds: the views re-derive from these caches, so
+# new rows only show up once the loader entries expire too
+@st.cache_data(ttl=3600)
+def load_peopleflow_meta():
+    conn = get_connection()
+    min_ts, max_ts = conn.execute(
+        "SELECT MIN(created_at), MAX(created_at) FROM peopleflowtotals"
+    ).fetchone()
+    if min_ts is None:
+        return None, None
+    return pd.Timestamp(min_ts).date(), pd.Timestamp(max_ts).date()
+
+@st.cache_data(max_entries=32, ttl=3600)
+def load_camera_ids(start_date, end_date):
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT DISTINCT camera_id FROM peopleflowtotals "
+        "WHERE created_at >= ? AND created_at < ? ORDER BY camera_id",
+        date_bounds(start_date, end_date)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+@st.cache_data(max_entries=32, ttl=3600)
+def load_peopleflow_filtered(start_date, end_date, cameras, only_valid):
+    placeholders = ",".join("?" * len(cameras))
+    valid_clause = "AND valid = 1" if only_valid else ""
+    # Aggregate to the (camera_id, hour timestamp) cube in SQLite; every chart
+    # below is a re-aggregation of this cube
+    sql = f"""
+        SELECT camera_id,
+               strftime('%Y-%m-%d %H:00:00', created_at) AS ts_hour,
+               SUM(total_inside) AS total_inside,
+               SUM(total_outside) AS total_outside
+        FROM peopleflowtotals
+        WHERE created_at >= ? AND created_at < ?
+          AND camera_id IN ({placeholders})
+          {valid_clause}
+        GROUP BY camera_id, ts_hour
+        ORDER BY camera_id, ts_hour
+    """
+    conn = get_connection()
+    df = pd.read_sql_query(
+        sql,
+        conn,
+        params=[*date_bounds(start_date, end_date), *cameras],
+        parse_dates=["ts_hour"]
+    )
+    # Small integer group keys: ts_hour and date are datetime64 (int64), hour
+    # fits in int8, camera_id is coded against the selected cameras
+    df["date"] = df["ts_hour"].dt.normalize()
+    df["hour"] = df["ts_hour"].dt.hour.astype("int8")
+    df["camera_id"] = pd.Categorical(df["camera_id"], categories=sorted(cameras))
+    return df
+
+DIRECTIONS = ["total_inside", "total_outside"]
+
+def melt_directions(df, id_vars):
+    # Same layout as df.melt(id_vars, DIRECTIONS): all inside rows, then all outside rows
+    long_df = pd.DataFrame({col: np.tile(df[col].to_numpy(), 2) for col in id_vars})
+    long_df["direction"] = pd.Categorical(np.repeat(DIRECTIONS, len(df)), categories=DIRECTIONS)
+    long_df["count"] = np.concatenate([df[col].to_numpy() for col in DIRECTIONS])
+    return long_df
+
+MAX_HOURLY_BARS = 500
+
+def direction_bar_chart(long_df):
+    # Beyond MAX_HOURLY_BARS rows the per-hour bars are unreadable and heavy
+    # to ship to the browser, so fall back to one bar per day
+    if len(long_df) > MAX_HOURLY_BARS:
+        day = long_df["ts_hour"].dt.normalize().rename("date")
+        data = (
+            long_df.groupby([day, "direction"], observed=True)["count"]
+            .sum()
+            .reset_index()
+        )
+        x = alt.X("date:T", title="Date")
+        tooltip = ["date", "direction", "count"]
+    else:
+        data = long_df
+        # Vega formats and orders the hour buckets client-side
+        x = alt.X("ts_hour:O", timeUnit="yearmonthdatehours", title="Date & hour")
+        tooltip = [alt.Tooltip("ts_hour:T", title="Date & hour", format="%Y-%m-%d %H:00"), "direction", "count"]
+
+    return (
+        alt.Chart(data)
+        .mark_bar()
+        .encode(
+            x=x,
+            y=alt.Y("count:Q", title="People count"),
+            color=alt.Color("direction:N", title="Direction"),
+            tooltip=tooltip
+        )
+        .properties(height=400)
+    )
+
+# -----------------------------------------
+# Derived views, cached per (start, end, cameras, only_valid)
+# -----------------------------------------
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_hourly_combined(start_date, end_date, cameras, only_valid):
+    df = load_peopleflow_filtered(start_date, end_date, cameras, only_valid)
+    return (
+        df.groupby("ts_hour")
+        .agg(
+            total_inside=("total_inside", "sum"),
+            total_outside=("total_outside", "sum")
+        )
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_camera_hour(start_date, end_date, cameras, only_valid):
+    # Camera × hour totals, shared by the heatmap, peak table and comparison chart
+    df = load_peopleflow_filtered(start_date, end_date, cameras, only_valid)
+    return (
+        df.groupby(["camera_id", "hour"], sort=False, observed=True)
+        .agg(total_flow=("total_inside", "sum"))
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_daily(start_date, end_date, cameras, only_valid):
+    df = load_peopleflow_filtered(start_date, end_date, cameras, only_valid)
+    return (
+        df.groupby("date", sort=False)
+        .agg(
+            total_inside=("total_inside", "sum"),
+            total_outside=("total_outside", "sum")
+        )
+        .reset_index()
+    )
+
+@st.cache_data(max_entries=32, ttl=3600)
+def compute_peak(start_date, end_date, cameras, only_valid):
+    # One sort + dedup; ties go to the earliest hour, like idxmax
+    cam_hour = compute_camera_hour(start_date, end_date, cameras, only_valid)
+    return (
+        cam_hour.sort_values(["total_flow", "hour"], ascending=[False, True])
+        .drop_duplicates("camera_id")
+        .sort_values("camera_id")
+    )
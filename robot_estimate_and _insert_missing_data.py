@@ -1,11 +1,37 @@
+import logging
 import sqlite3
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 from typing import Dict, List, Tuple, Optional, Set
 import warnings
 warnings.filterwarnings('ignore')
 
+log = logging.getLogger(__name__)
+LOG_FORMAT = '%(message)s'
+
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-65536",
+)
+
+# Índices usados pelas consultas de carga e pela gravação das estimativas (nome, DDL).
+# peopleflowtotals fica com dois índices, um por caminho de acesso: este, por câmera
+# (camera_id, created_at), e ix_pft_created do setup, por período, para os dashboards
+SQLITE_INDEXES = (
+    # Não é UNIQUE: a tabela pode já ter mais de um registro por (câmera, horário)
+    ("idx_pft_cam_time",
+     "CREATE INDEX IF NOT EXISTS idx_pft_cam_time ON peopleflowtotals(camera_id, created_at)"),
+    ("idx_login_cam_cl",
+     "CREATE INDEX IF NOT EXISTS idx_login_cam_cl ON login_camera(client, location)"),
+)
+
 class CameraDataImputer:
     def __init__(self, db_path: str, target_client_locations: List[Tuple[str, str]] = None):
         """
@@ -20,7 +46,20 @@ class CameraDataImputer:
         self.target_client_locations = target_client_locations
         self.conn = None
         self.cameras_df = None
+        self._camera_info = {}
         self.flow_df = None
+        self._hist_stats_df = None
+        self.flow_by_key = None
+        self._history_cache = {}
+        self._daily_totals_cache = {}
+        self._weekday_factors = None
+        self._sanity_bounds = None
+        self._rows_by_camera_hour = None
+        self.flow = None
+        self._preloaded = {}
+        self._active_hours = {}
+        # Razão e confiança por (câmera_a, câmera_b, hora, dia da semana), válidas até o próximo carregamento
+        self._ratio_stats = lru_cache(maxsize=None)(self._compute_ratio_stats)
         self.weekday_columns = {
             0: ('counting_hour_monday', 'counting_hour_monday_qtd'),    # Segunda-feira
             1: ('counting_hour_tuesday', 'counting_hour_tuesday_qtd'),  # Terça-feira
@@ -31,14 +70,61 @@ class CameraDataImputer:
             6: ('counting_hour_sunday', 'counting_hour_sunday_qtd'),        # Domingo
         }
         
+    def __enter__(self):
+        """Abre a conexão ao entrar no bloco with."""
+        self.connect()
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Fecha a conexão ao sair do bloco with."""
+        self.disconnect()
+        
     def connect(self):
-        """Estabelece conexão com o banco de dados."""
+        """Estabelece conexão com o banco de dados (reaproveitada durante toda a execução)."""
+        if self.conn is not None:
+            return
         self.conn = sqlite3.connect(self.db_path)
+        # Transações controladas explicitamente por _txn()
+        self.conn.isolation_level = None
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(f"PRAGMA {pragma}")
+        self._ensure_indexes()
+        
+    def _ensure_indexes(self):
+        """Cria os índices de carga que faltarem e atualiza as estatísticas do planejador."""
+        existing = {
+            name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+        missing = [ddl for name, ddl in SQLITE_INDEXES if name not in existing]
+        if not missing:
+            return
+            
+        with self._txn() as cursor:
+            for ddl in missing:
+                cursor.execute(ddl)
+        # ANALYZE só quando algum índice foi criado, para o planejador passar a usá-lo
+        self.conn.execute("ANALYZE")
+        
+    @contextmanager
+    def _txn(self, mode: str = "IMMEDIATE"):
+        """
+        Executa o bloco em uma única transação (BEGIN IMMEDIATE ... COMMIT por padrão).
+        Use mode="DEFERRED" quando o bloco só escreve em tabelas temporárias.
+        """
+        self.conn.execute(f"BEGIN {mode}")
+        try:
+            yield self.conn.cursor()
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
         
     def disconnect(self):
         """Fecha a conexão com o banco de dados."""
         if self.conn:
             self.conn.close()
+            self.conn = None
             
     def get_client_location_list(self) -> List[Tuple[str, str]]:
         """
@@ -56,37 +142,23 @@ class CameraDataImputer:
             ORDER BY client, location
         """
         df = pd.read_sql_query(query, self.conn)
-        self.disconnect()
         
         client_locations = list(df.itertuples(index=False, name=None))
         print(f"Encontrados {len(client_locations)} pares cliente-localização no banco de dados")
         return client_locations
     
-    def load_data_for_client_location(self, client: str, location: str, days_back: int = 30) -> bool:
-        """
-        Carrega dados de câmeras e fluxo de pessoas para um cliente-localização específico.
-        
-        Args:
-            client: Nome do cliente
-            location: Nome da localização
-            days_back: Número de dias para carregar dados históricos
-            
-        Returns:
-            True se dados carregados com sucesso, False caso contrário
-        """
-        print(f"\n{'='*60}")
-        print(f"Processando: {client} - {location}")
-        print(f"{'='*60}")
-        
-        self.connect()
-        
-        # Carrega câmeras para este cliente-localização específico
-        camera_query = """
+    def _cutoff_date(self, days_back: int) -> str:
+        """Data de corte do histórico, no formato usado por created_at."""
+        return (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _query_cameras(self, client_locations: List[Tuple[str, str]]) -> pd.DataFrame:
+        """Carrega as câmeras (com horários por dia da semana) dos pares cliente-localização."""
+        pairs = ','.join(['(?, ?)'] * len(client_locations))
+        camera_query = f"""
             SELECT 
                 id,
                 client,
                 location,
-                pong_ts,
                 counting_hour_sunday,
                 counting_hour_sunday_qtd,
                 counting_hour_monday,
@@ -100,66 +172,195 @@ class CameraDataImputer:
                 counting_hour_fryday,
                 counting_hour_fryday_qtd,
                 counting_hour_saturday,
-                counting_hour_saturday_qtd,
-                counting_hour_holiday,
-                counting_hour_holiday_qtd
+                counting_hour_saturday_qtd
             FROM login_camera
-            WHERE client = ? AND location = ?
+            WHERE (client, location) IN (VALUES {pairs})
         """
-        
-        self.cameras_df = pd.read_sql_query(camera_query, self.conn, params=[client, location])
-        
-        if self.cameras_df.empty:
-            print(f"Nenhuma câmera encontrada para {client} - {location}")
-            self.disconnect()
-            return False
-            
-        print(f"Carregadas {len(self.cameras_df)} câmeras para {client} - {location}")
-        
-        # Obtém IDs das câmeras para este cliente-localização
-        target_camera_ids = self.cameras_df['id'].unique()
-        
-        # Calcula data de corte baseada em days_back
-        cutoff_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Carrega totais de fluxo de pessoas para os últimos N dias, apenas para câmeras alvo
-        placeholders = ','.join(['?'] * len(target_camera_ids))
-        
-        peopleflow_query = f"""
+        params = [value for pair in client_locations for value in pair]
+        return pd.read_sql_query(camera_query, self.conn, params=params)
+    
+    def _query_flow(self, camera_ids: np.ndarray, cutoff_date: str) -> pd.DataFrame:
+        """Carrega os totais de fluxo válidos das câmeras a partir da data de corte."""
+        # IDs em uma tabela temporária: a consulta tem texto fixo, qualquer que seja
+        # o número de câmeras, e o planejador faz a junção pelo índice
+        with self._txn("DEFERRED") as cursor:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS tcams(id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM tcams")
+            cursor.executemany("INSERT OR IGNORE INTO tcams VALUES (?)", [(int(x),) for x in camera_ids])
+        
+        peopleflow_query = """
             SELECT id, created_at, camera_id, total_inside, total_outside, valid 
             FROM peopleflowtotals 
             WHERE created_at >= ? 
-            AND camera_id IN ({placeholders})
+            AND camera_id IN (SELECT id FROM tcams)
             AND valid = 1
         """
         
-        # Prepara parâmetros
-        peopleflow_params = [cutoff_date] + target_camera_ids.tolist()
-        
-        self.flow_df = pd.read_sql_query(
+        return pd.read_sql_query(
             peopleflow_query, 
             self.conn, 
-            params=peopleflow_params
+            params=[cutoff_date]
         )
+    
+    def preload_client_locations(self, client_locations: List[Tuple[str, str]], days_back: int = 30):
+        """
+        Lê câmeras e fluxo de todos os pares cliente-localização com uma consulta
+        para cada tabela e reparte o resultado por par. load_data_for_client_location
+        consome essas partes em vez de consultar o banco novamente.
+        
+        Args:
+            client_locations: Lista de tuplas (cliente, localização)
+            days_back: Número de dias para carregar dados históricos
+        """
+        self.connect()
+        self._preloaded = {}
+        
+        if not client_locations:
+            return
+        
+        cameras = self._query_cameras(client_locations)
+        flow = self._query_flow(cameras['id'].unique(), self._cutoff_date(days_back))
+        
+        # Posições das câmeras de cada par e das linhas de fluxo de cada câmera,
+        # preservando a ordem lida
+        camera_rows = cameras.groupby(['client', 'location'], sort=False).indices
+        flow_rows = flow.groupby('camera_id', sort=False).indices
+        no_rows = np.array([], dtype=np.intp)
+        
+        for client, location in client_locations:
+            pair_cameras = cameras.iloc[camera_rows.get((client, location), no_rows)]
+            rows = np.concatenate(
+                [no_rows] + [flow_rows.get(camera_id, no_rows) for camera_id in pair_cameras['id'].unique()]
+            )
+            rows.sort()
+            self._preloaded[(client, location)] = (
+                pair_cameras.reset_index(drop=True),
+                flow.iloc[rows].reset_index(drop=True),
+            )
+    
+    def load_data_for_client_location(self, client: str, location: str, days_back: int = 30) -> bool:
+        """
+        Carrega dados de câmeras e fluxo de pessoas para um cliente-localização específico.
+        
+        Args:
+            client: Nome do cliente
+            location: Nome da localização
+            days_back: Número de dias para carregar dados históricos
+            
+        Returns:
+            True se dados carregados com sucesso, False caso contrário
+        """
+        print(f"\n{'='*60}")
+        print(f"Processando: {client} - {location}")
+        print(f"{'='*60}")
+        
+        self.connect()
+        
+        preloaded = self._preloaded.pop((client, location), None)
+        if preloaded is not None:
+            # Câmeras e fluxo já lidos em lote por preload_client_locations
+            self.cameras_df, flow_df = preloaded
+        else:
+            # Carrega câmeras para este cliente-localização específico
+            self.cameras_df = self._query_cameras([(client, location)])
+            flow_df = None
+        
+        if self.cameras_df.empty:
+            print(f"Nenhuma câmera encontrada para {client} - {location}")
+            return False
+            
+        print(f"Carregadas {len(self.cameras_df)} câmeras para {client} - {location}")
+        
+        # Horários viram a tabela (câmera, dia da semana); cameras_df guarda só a identificação
+        self._build_active_hours(self.cameras_df)
+        self.cameras_df = self.cameras_df[['id', 'client', 'location']]
+        # client/location por id de câmera, para montar os registros sem varrer cameras_df
+        self._camera_info = self.cameras_df.set_index('id')[['client', 'location']].to_dict('index')
+        
+        if flow_df is None:
+            # Carrega totais de fluxo de pessoas para os últimos N dias, apenas para câmeras alvo
+            flow_df = self._query_flow(self.cameras_df['id'].unique(), self._cutoff_date(days_back))
+        
+        self.flow_df = flow_df
+        self._hist_stats_df = None
+        self.flow_by_key = None
+        self._history_cache = {}
+        self._daily_totals_cache = {}
+        self._weekday_factors = None
+        self._sanity_bounds = None
+        self._rows_by_camera_hour = None
+        self._ratio_stats.cache_clear()
+        self.flow = None
         
         # Converte colunas de data/hora
         if not self.flow_df.empty:
             self.flow_df['created_at'] = pd.to_datetime(self.flow_df['created_at'])
-            self.flow_df['date'] = self.flow_df['created_at'].dt.date
-            self.flow_df['hour'] = self.flow_df['created_at'].dt.hour
-            self.flow_df['weekday'] = self.flow_df['created_at'].dt.weekday
+            # Colunas derivadas em tipos numpy compactos (datetime64 de dia e int8)
+            ts = self.flow_df['created_at'].to_numpy(dtype='datetime64[ns]')
+            days = ts.astype('datetime64[D]')
+            self.flow_df['date'] = days
+            # Dia como inteiro (dias desde 1970-01-01) para agrupar e comparar sem Timestamps
+            self.flow_df['date_ord'] = days.astype(np.int32)
+            self.flow_df['hour'] = (ts.astype('datetime64[h]').astype('int64') % 24).astype('int8')
+            # 1970-01-01 foi uma quinta-feira (weekday 3)
+            self.flow_df['weekday'] = ((days.astype('int64') - 4) % 7).astype('int8')
+            self.flow_df['total'] = (self.flow_df['total_inside'].values + self.flow_df['total_outside'].values).astype(np.int32)
+            
+            # Colunas dos caminhos quentes como arrays numpy tipados
+            self.flow = SimpleNamespace(
+                camera_id=self.flow_df['camera_id'].to_numpy(dtype=np.int32),
+                date=self.flow_df['date_ord'].to_numpy(),
+                hour=self.flow_df['hour'].to_numpy(),
+                weekday=self.flow_df['weekday'].to_numpy(),
+                inside=self.flow_df['total_inside'].to_numpy(dtype=np.int32),
+                outside=self.flow_df['total_outside'].to_numpy(dtype=np.int32),
+                total=self.flow_df['total'].to_numpy(),
+                valid=self.flow_df['valid'].to_numpy(dtype=np.int8),
+            )
             
             # Calcula intervalo de datas carregado
-            min_date = self.flow_df['date'].min()
-            max_date = self.flow_df['date'].max()
+            min_date = self.flow_df['date'].min().date()
+            max_date = self.flow_df['date'].max().date()
             date_range_days = (max_date - min_date).days + 1 if max_date != min_date else 1
             print(f"Carregados {len(self.flow_df)} registros de fluxo de {min_date} a {max_date} ({date_range_days} dias)")
+            
+            # Índice ordenado para fatiar o histórico por (câmera, dia da semana, hora)
+            self.flow_by_key = self.flow_df.set_index(['camera_id', 'weekday', 'hour']).sort_index()
         else:
             print(f"Nenhum dado de fluxo encontrado para {client} - {location}")
             return False
             
         return True
     
+    def _build_active_hours(self, camera_hours: pd.DataFrame):
+        """
+        Pré-calcula o intervalo de horas ativas de cada (câmera, dia da semana)
+        a partir das colunas counting_hour_* em formato longo.
+        """
+        weekdays = list(self.weekday_columns)
+        start_cols = [self.weekday_columns[weekday][0] for weekday in weekdays]
+        end_cols = [self.weekday_columns[weekday][1] for weekday in weekdays]
+        
+        # Uma linha por (câmera, dia da semana)
+        long_df = pd.DataFrame({
+            'id': np.repeat(camera_hours['id'].to_numpy(), len(weekdays)),
+            'weekday': np.tile(weekdays, len(camera_hours)),
+            'start': camera_hours[start_cols].to_numpy(dtype=float).ravel(),
+            'end': camera_hours[end_cols].to_numpy(dtype=float).ravel(),
+        })
+        # Primeira linha da câmera prevalece
+        long_df = long_df.drop_duplicates(['id', 'weekday'])
+        
+        # Valores None/NaN usam o dia inteiro; demais são truncados e limitados a [0, 23]
+        missing = long_df['start'].isna() | long_df['end'].isna()
+        start_hours = np.where(missing, 0, np.clip(np.trunc(long_df['start'].fillna(0)), 0, 23)).astype(int)
+        end_hours = np.where(missing, 23, np.clip(np.trunc(long_df['end'].fillna(0)), 0, 23)).astype(int)
+        
+        self._active_hours = dict(zip(
+            zip(long_df['id'].tolist(), long_df['weekday'].tolist()),
+            zip(start_hours.tolist(), end_hours.tolist())
+        ))
+    
     def get_camera_active_hours(self, camera_id: int, weekday: int) -> Tuple[int, int]:
         """
         Obtém intervalo de horas ativas para uma câmera específica e dia da semana.
@@ -171,27 +372,8 @@ class CameraDataImputer:
         Returns:
             Tupla de (hora_inicio, hora_fim)
         """
-        if camera_id not in self.cameras_df['id'].values:
-            return (0, 23)  # Padrão para todas as horas se câmera não encontrada
-            
-        camera_row = self.cameras_df[self.cameras_df['id'] == camera_id].iloc[0]
-        
-        if weekday in self.weekday_columns:
-            start_col, end_col = self.weekday_columns[weekday]
-            start_hour = camera_row[start_col]
-            end_hour = camera_row[end_col]
-            
-            # Lida com valores None/NaN
-            if pd.isna(start_hour) or pd.isna(end_hour):
-                return (0, 23)
-                
-            # Garante intervalo válido
-            start_hour = max(0, min(23, int(start_hour)))
-            end_hour = max(0, min(23, int(end_hour)))
-            
-            return (start_hour, end_hour)
-        else:
-            return (0, 23)  # Padrão para todas as horas
+        # Padrão para todas as horas se câmera ou dia não encontrados
+        return self._active_hours.get((camera_id, weekday), (0, 23))
         
     def get_last_valid_day(self) -> Optional[datetime]:
         """
@@ -205,7 +387,7 @@ class CameraDataImputer:
             return None
             
         # Obtém a data mais recente dos dados válidos
-        last_date = self.flow_df['date'].max()
+        last_date = self.flow_df['date'].max().date()
         last_datetime = datetime.combine(last_date, datetime.min.time())
         
         print(f"Último dia válido para este cliente-localização: {last_date}")
@@ -232,195 +414,251 @@ class CameraDataImputer:
             target_date = self.get_last_valid_day()
             
         if target_date is None:
-            print("Nenhuma data alvo disponível. Não é possível identificar câmeras com falha.")
+            log.warning("Nenhuma data alvo disponível. Não é possível identificar câmeras com falha.")
             return {}
             
         target_date_str = target_date.strftime('%Y-%m-%d')
         target_weekday = target_date.weekday()
-        print(f"\nVerificando câmeras com falha em {target_date_str} (dia da semana: {target_weekday})")
+        log.info("\nVerificando câmeras com falha em %s (dia da semana: %s)", target_date_str, target_weekday)
         
         # Obtém todos os IDs de câmera para o cliente-localização atual
         camera_ids = self.cameras_df['id'].tolist()
         
+        # Estatísticas históricas de todas as (câmera, dia da semana, hora) em uma passada
+        self._build_historical_statistics()
+        
         # Obtém dados para a data alvo
+        target_day = np.datetime64(target_date.date(), 'D').astype(np.int32)
         target_data = self.flow_df[
-            (self.flow_df['camera_id'].isin(camera_ids)) &
-            (self.flow_df['date'] == target_date.date()) & 
-            (self.flow_df['valid'] == 1)
+            np.isin(self.flow.camera_id, camera_ids) &
+            (self.flow.date == target_day) &
+            (self.flow.valid == 1)
         ]
         
+        # Indexa uma vez por (câmera, hora); mantém a primeira linha em caso de duplicatas
+        target_idx = target_data.set_index(['camera_id', 'hour'], drop=False)
+        target_idx = target_idx[~target_idx.index.duplicated(keep='first')].sort_index()
+        
+        # Todos os critérios avaliados de uma vez, em colunas
+        evaluation = self._evaluate_target_hours(target_idx, target_weekday)
+        
+        # Grade câmera x hora: linha de evaluation de cada (câmera, hora), -1 sem dados
+        camera_pos = pd.Index(camera_ids).drop_duplicates()
+        row_of = np.full((len(camera_pos), 24), -1)
+        row_of[camera_pos.get_indexer(target_idx['camera_id']), target_idx['hour'].to_numpy()] = np.arange(len(evaluation))
+        
+        # Câmera sem dados numa hora ativa também conta como falha
+        failed_grid = np.ones((len(camera_pos), 24), dtype=bool)
+        has_row = row_of >= 0
+        failed_grid[has_row] = evaluation['failed'].to_numpy()[row_of[has_row]]
+        
         failing_cameras = {}
         
         for camera_id in camera_ids:
             # Obtém intervalo de horas ativas para esta câmera e dia da semana
             start_hour, end_hour = self.get_camera_active_hours(camera_id, target_weekday)
-            active_hours = list(range(start_hour, end_hour + 1))
+            active_hours = np.arange(start_hour, end_hour + 1)
             
-            if not active_hours:
+            if not len(active_hours):
                 continue
                 
-            camera_failed_hours = []
+            pos = camera_pos.get_loc(camera_id)
+            camera_failed_hours = active_hours[failed_grid[pos, active_hours]].tolist()
             
-            for hour in active_hours:
-                hour_data = target_data[
-                    (target_data['camera_id'] == camera_id) &
-                    (target_data['hour'] == hour)
-                ]
-                
-                if hour_data.empty:
-                    # Câmera não tem dados para esta hora ativa
-                    camera_failed_hours.append(hour)
-                    print(f"  ⚠️ Câmera {camera_id} hora {hour}: SEM DADOS")
-                else:
-                    # Verifica contagens anormalmente baixas
-                    row = hour_data.iloc[0]
-                    current_inside = row['total_inside']
-                    current_outside = row['total_outside']
-                    current_count = current_inside + current_outside
-                    
-                    # Obtém estatísticas históricas detalhadas
-                    hist_stats = self._get_historical_statistics(camera_id, hour, target_weekday)
-                    hist_avg = hist_stats['mean']
-                    hist_std = hist_stats['std']
-                    hist_min = hist_stats['min']
-                    hist_max = hist_stats['max']
-                    hist_count = hist_stats['count']
-                    
-                    # CRITÉRIO 1: Comparação com média histórica
-                    # Se count > 0 para evitar divisão por zero
-                    if hist_count >= 3 and hist_avg > 0:
-                        ratio = current_count / hist_avg
-                        
-                        # Detectar valores muito baixos (10x menor = ratio = 0.1)
-                        if ratio < 0.1:  # 10x menor que a média
-                            camera_failed_hours.append(hour)
-                            print(f"  ❌ Câmera {camera_id} hora {hour}: VALOR 10x MENOR")
-                            print(f"     Atual: {current_count} (inside: {current_inside}, outside: {current_outside})")
-                            print(f"     Média histórica: {hist_avg:.1f}")
-                            print(f"     Ratio: {ratio:.3f} (esperado ~1.0)")
-                            continue
-                        
-                        # CRITÉRIO 2: Menos que 20% da média (já existente)
-                        if current_count < (hist_avg * 0.2):
-                            camera_failed_hours.append(hour)
-                            print(f"  ⚠️ Câmera {camera_id} hora {hour}: MENOS DE 20% DA MÉDIA")
-                            print(f"     Atual: {current_count} vs Média: {hist_avg:.1f}")
-                            continue
-                        
-                        # CRITÉRIO 3: Fora de 3 desvios padrão (para distribuição normal)
-                        if hist_std > 0:
-                            z_score = abs(current_count - hist_avg) / hist_std
-                            if z_score > 3:
-                                camera_failed_hours.append(hour)
-                                print(f"  ⚠️ Câmera {camera_id} hora {hour}: FORA DE 3 DESVIOS PADRÃO")
-                                print(f"     Z-score: {z_score:.2f}")
-                                continue
-                        
-                        # CRITÉRIO 4: Verificar se inside/outside está balanceado
-                        # Geralmente inside >= outside
-                        if current_inside > 0 and current_outside > 0:
-                            inside_ratio = current_inside / current_count
-                            if inside_ratio < 0.3 or inside_ratio > 0.9:  # Fora do range normal
-                                camera_failed_hours.append(hour)
-                                print(f"  ⚠️ Câmera {camera_id} hora {hour}: BALANCEAMENTO ANORMAL")
-                                print(f"     Inside ratio: {inside_ratio:.2f} (inside: {current_inside}, outside: {current_outside})")
-                                continue
-                        
-                        # Se passou em todos os critérios
-                        print(f"  ✅ Câmera {camera_id} hora {hour}: OK")
-                        print(f"     Valor: {current_count}, Histórico: {hist_avg:.1f}±{hist_std:.1f}")
-                    
+            # Diagnóstico por hora só é formatado quando o nível DEBUG está ativo
+            if log.isEnabledFor(logging.DEBUG):
+                for hour in active_hours.tolist():
+                    row = row_of[pos, hour]
+                    if row < 0:
+                        # Câmera não tem dados para esta hora ativa
+                        log.debug("  ⚠️ Câmera %s hora %s: SEM DADOS", camera_id, hour)
                     else:
-                        # Dados históricos insuficientes
-                        print(f"  ℹ️ Câmera {camera_id} hora {hour}: DADOS HISTÓRICOS INSUFICIENTES")
-                        print(f"     Registros históricos: {hist_count}")
-                        print(f"     Valor atual: {current_count}")
-                        
-                        # Se não tem dados históricos mas o valor atual é muito baixo
-                        if current_count < 10:  # Valor absoluto muito baixo
-                            camera_failed_hours.append(hour)
-                            print(f"     ⚠️ Marcado como falha: valor absoluto muito baixo")
+                        self._log_hour_verdict(camera_id, hour, evaluation.iloc[row])
             
             if camera_failed_hours:
                 failing_cameras[camera_id] = camera_failed_hours
         
         # Imprime resumo
-        print(f"\n{'='*60}")
-        print(f"RESUMO: Encontradas {len(failing_cameras)} câmeras com falha")
-        print(f"{'='*60}")
+        log.info("\n%s", '='*60)
+        log.info("RESUMO: Encontradas %d câmeras com falha", len(failing_cameras))
+        log.info("%s", '='*60)
         
         for camera_id, hours in failing_cameras.items():
-            camera_info = self.cameras_df[self.cameras_df['id'] == camera_id].iloc[0]
+            camera_info = self._camera_info[camera_id]
             start_hour, end_hour = self.get_camera_active_hours(camera_id, target_weekday)
-            print(f"  Câmera {camera_id} ({camera_info['location']}):")
-            print(f"    Horas ativas: {start_hour}-{end_hour}")
-            print(f"    Horas com falha: {hours}")
+            log.info("  Câmera %s (%s):", camera_id, camera_info['location'])
+            log.info("    Horas ativas: %s-%s", start_hour, end_hour)
+            log.info("    Horas com falha: %s", hours)
             
         return failing_cameras
 
-    def _get_historical_statistics(self, camera_id: int, hour: int, weekday: int) -> Dict[str, float]:
+    def _evaluate_target_hours(self, target_idx: pd.DataFrame, target_weekday: int) -> pd.DataFrame:
         """
-        Obtém estatísticas históricas detalhadas para câmera, hora e dia da semana.
+        Avalia os critérios de falha para todas as (câmera, hora) do dia alvo
+        de uma só vez, comparando com as estatísticas históricas.
         
+        Args:
+            target_idx: Dados do dia alvo indexados por (camera_id, hour)
+            target_weekday: Dia da semana do dia alvo
+            
         Returns:
-            Dicionário com: mean, std, min, max, count, q1, q3
+            DataFrame indexado por (camera_id, hour) com as contagens, as
+            estatísticas, as razões calculadas e o veredito de cada hora
         """
-        # Obtém dados históricos
-        mask = (
-            (self.flow_df['camera_id'] == camera_id) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        )
-        
-        historical_data = self.flow_df[mask]
+        if self._hist_stats_df is None:
+            self._build_historical_statistics()
         
-        if len(historical_data) == 0:
-            return {
-                'mean': 0, 'std': 0, 'min': 0, 'max': 0, 
-                'count': 0, 'q1': 0, 'q3': 0, 'median': 0
-            }
+        stats = self._hist_stats_df
+        if target_weekday in stats.index.unique('weekday'):
+            hist = stats.xs(target_weekday, level='weekday')
+        else:
+            hist = stats.iloc[:0].droplevel('weekday')
+        hist = hist.reindex(target_idx.index)
+        
+        inside = target_idx['total_inside'].to_numpy()
+        outside = target_idx['total_outside'].to_numpy()
+        count = target_idx['total'].to_numpy()
+        hist_avg = hist['mean'].fillna(0).to_numpy()
+        hist_std = hist['std'].fillna(0).to_numpy()
+        hist_count = hist['count'].fillna(0).astype(int).to_numpy()
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.divide(count, hist_avg)
+            z_score = np.abs(count - hist_avg) / np.where(hist_std > 0, hist_std, 1)
+            inside_ratio = np.divide(inside, count)
+        
+        # Mesma ordem de prioridade dos critérios: o primeiro que casar decide
+        has_history = (hist_count >= 3) & (hist_avg > 0)
+        conditions = [
+            has_history & (ratio < 0.1),
+            has_history & (count < hist_avg * 0.2),
+            has_history & (hist_std > 0) & (z_score > 3),
+            has_history & (inside > 0) & (outside > 0) & ((inside_ratio < 0.3) | (inside_ratio > 0.9)),
+            has_history,
+            count < 10,
+        ]
+        verdicts = ['10x_menor', 'menos_20', 'desvio_padrao', 'balanceamento', 'ok', 'absoluto_baixo']
+        verdict = np.select(conditions, verdicts, default='sem_historico')
+        
+        return pd.DataFrame({
+            'inside': inside,
+            'outside': outside,
+            'count': count,
+            'hist_avg': hist_avg,
+            'hist_std': hist_std,
+            'hist_count': hist_count,
+            'ratio': ratio,
+            'z_score': z_score,
+            'inside_ratio': inside_ratio,
+            'verdict': verdict,
+            'failed': ~np.isin(verdict, ['ok', 'sem_historico']),
+        }, index=target_idx.index)
+    
+    def _log_hour_verdict(self, camera_id: int, hour: int, result: pd.Series):
+        """Registra (nível DEBUG) o diagnóstico de uma (câmera, hora) avaliada."""
+        verdict = result['verdict']
+        current_inside = result['inside']
+        current_outside = result['outside']
+        current_count = result['count']
+        hist_avg = result['hist_avg']
+        
+        if verdict == '10x_menor':
+            log.debug("  ❌ Câmera %s hora %s: VALOR 10x MENOR", camera_id, hour)
+            log.debug("     Atual: %s (inside: %s, outside: %s)", current_count, current_inside, current_outside)
+            log.debug("     Média histórica: %.1f", hist_avg)
+            log.debug("     Ratio: %.3f (esperado ~1.0)", result['ratio'])
+        elif verdict == 'menos_20':
+            log.debug("  ⚠️ Câmera %s hora %s: MENOS DE 20%% DA MÉDIA", camera_id, hour)
+            log.debug("     Atual: %s vs Média: %.1f", current_count, hist_avg)
+        elif verdict == 'desvio_padrao':
+            log.debug("  ⚠️ Câmera %s hora %s: FORA DE 3 DESVIOS PADRÃO", camera_id, hour)
+            log.debug("     Z-score: %.2f", result['z_score'])
+        elif verdict == 'balanceamento':
+            log.debug("  ⚠️ Câmera %s hora %s: BALANCEAMENTO ANORMAL", camera_id, hour)
+            log.debug("     Inside ratio: %.2f (inside: %s, outside: %s)",
+                      result['inside_ratio'], current_inside, current_outside)
+        elif verdict == 'ok':
+            log.debug("  ✅ Câmera %s hora %s: OK", camera_id, hour)
+            log.debug("     Valor: %s, Histórico: %.1f±%.1f", current_count, hist_avg, result['hist_std'])
+        else:
+            # Dados históricos insuficientes
+            log.debug("  ℹ️ Câmera %s hora %s: DADOS HISTÓRICOS INSUFICIENTES", camera_id, hour)
+            log.debug("     Registros históricos: %s", result['hist_count'])
+            log.debug("     Valor atual: %s", current_count)
+            
+            # Se não tem dados históricos mas o valor atual é muito baixo
+            if verdict == 'absoluto_baixo':
+                log.debug("     ⚠️ Marcado como falha: valor absoluto muito baixo")
+
+    def _build_historical_statistics(self):
+        """
+        Calcula as estatísticas históricas de todas as combinações
+        (câmera, dia da semana, hora) com um único groupby sobre os arrays de fluxo.
+        """
+        flow = self.flow
+        total_traffic = pd.Series(flow.total)
+        grouped = total_traffic.groupby([flow.camera_id, flow.weekday, flow.hour])
         
-        # Calcula tráfego total para cada registro
-        total_traffic = historical_data['total_inside'] + historical_data['total_outside']
-        
-        # Estatísticas básicas
-        stats = {
-            'mean': total_traffic.mean(),
-            'std': total_traffic.std(),
-            'min': total_traffic.min(),
-            'max': total_traffic.max(),
-            'count': len(total_traffic),
-            'median': total_traffic.median()
-        }
+        stats = grouped.agg(['mean', 'std', 'min', 'max', 'count', 'median'])
+        stats.index.names = ['camera_id', 'weekday', 'hour']
         
-        # Quartis (se tiver dados suficientes)
-        if len(total_traffic) >= 4:
-            stats['q1'] = total_traffic.quantile(0.25)
-            stats['q3'] = total_traffic.quantile(0.75)
-        else:
-            stats['q1'] = stats['median']
-            stats['q3'] = stats['median']
+        # Quartis (se tiver dados suficientes), senão a mediana
+        enough = stats['count'] >= 4
+        stats['q1'] = grouped.quantile(0.25).where(enough, stats['median'])
+        stats['q3'] = grouped.quantile(0.75).where(enough, stats['median'])
         
-        return stats
+        self._hist_stats_df = stats
+
+    def _history_rows(self, camera_id: int, weekday: int, hour: int = None) -> pd.DataFrame:
+        """
+        Obtém as linhas históricas de uma câmera em um dia da semana (e hora, se
+        informada) fatiando o índice ordenado, sem máscaras booleanas sobre flow_df.
+        As fatias ficam em cache até o próximo carregamento, pois a mesma chave é
+        consultada várias vezes durante uma estimativa.
+        """
+        key = (camera_id, weekday) if hour is None else (camera_id, weekday, hour)
+        rows = self._history_cache.get(key)
+        if rows is None:
+            rows = self._history_cache[key] = self.flow_by_key.loc[key:key]
+        return rows
+
+    def _camera_hour_rows(self, camera_id: int, hour: int) -> np.ndarray:
+        """
+        Obtém as posições, nos arrays de self.flow, dos registros de uma câmera em
+        uma hora. O dicionário (câmera, hora) -> posições é montado uma vez por carga.
+        """
+        if self._rows_by_camera_hour is None:
+            self._rows_by_camera_hour = pd.Series(np.arange(len(self.flow.camera_id))).groupby(
+                [self.flow.camera_id, self.flow.hour]
+            ).indices
+        return self._rows_by_camera_hour.get((camera_id, hour), np.empty(0, dtype=np.intp))
 
+    def _daily_totals(self, camera_id: int, weekday: int, hour: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Obtém os totais diários (entrada + saída) de uma câmera em um dia da
+        semana e hora, como arrays de dias (ordenados, sem repetição) e totais.
+        Ficam em cache até o próximo carregamento.
+        """
+        key = (camera_id, weekday, hour)
+        totals = self._daily_totals_cache.get(key)
+        if totals is None:
+            rows = self._history_rows(camera_id, weekday, hour)
+            dates, day_of_row = np.unique(rows['date_ord'].to_numpy(), return_inverse=True)
+            sums = np.bincount(day_of_row, weights=rows['total'].to_numpy(), minlength=len(dates))
+            totals = self._daily_totals_cache[key] = (dates, sums)
+        return totals
 
     def _get_historical_average(self, camera_id: int, hour: int, weekday: int, 
                                weeks_back: int = 4) -> float:
         """Obtém média histórica de contagens para câmera, hora e dia da semana específicos."""
         # Obtém dados de semanas anteriores (mesmo dia da semana, mesma hora)
-        mask = (
-            (self.flow_df['camera_id'] == camera_id) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        )
-        
-        historical_data = self.flow_df[mask]
+        historical_data = self._history_rows(camera_id, weekday, hour)
         
         if len(historical_data) == 0:
             return 0
             
         # Calcula tráfego total médio
-        total_traffic = historical_data['total_inside'] + historical_data['total_outside']
+        total_traffic = historical_data['total']
         return total_traffic.mean()
     
     def _get_camera_relationships(self, target_weekday: int) -> Dict[int, Dict[int, float]]:
@@ -435,48 +673,35 @@ class CameraDataImputer:
         """
         print(f"\nCalculando relações entre câmeras para dia da semana {target_weekday}...")
         
-        camera_relationships = {}
         camera_ids = self.cameras_df['id'].tolist()
-        
-        # Calcula totais diários para cada câmera para o dia da semana alvo
-        daily_totals = {}
-        for camera_id in camera_ids:
-            camera_data = self.flow_df[
-                (self.flow_df['camera_id'] == camera_id) &
-                (self.flow_df['weekday'] == target_weekday)
-            ]
-            
-            if len(camera_data) > 0:
-                daily_totals[camera_id] = {}
-                for date in camera_data['date'].unique():
-                    date_data = camera_data[camera_data['date'] == date]
-                    daily_total = (date_data['total_inside'].sum() + 
-                                  date_data['total_outside'].sum())
-                    daily_totals[camera_id][date] = daily_total
-        
-        # Calcula razões entre câmeras
-        for camera_id in camera_ids:
-            camera_relationships[camera_id] = {}
-            
-            if camera_id not in daily_totals:
-                continue
-                
-            for other_id in camera_ids:
-                if other_id == camera_id or other_id not in daily_totals:
-                    continue
-                    
-                # Encontra datas comuns
-                common_dates = set(daily_totals[camera_id].keys()) & set(daily_totals[other_id].keys())
-                if len(common_dates) >= 2:  # Precisa de pelo menos 2 datas comuns para razão confiável
-                    ratios = []
-                    for date in common_dates:
-                        if daily_totals[camera_id][date] > 0:
-                            ratio = daily_totals[other_id][date] / daily_totals[camera_id][date]
-                            ratios.append(ratio)
-                    
-                    if ratios:
-                        # Usa mediana para robustez contra outliers
-                        camera_relationships[camera_id][other_id] = np.median(ratios)
+        camera_relationships = {camera_id: {} for camera_id in camera_ids}
+        
+        # Totais diários por câmera para o dia da semana alvo: matriz data x câmera,
+        # NaN onde a câmera não tem dados na data
+        flow = self.flow
+        in_weekday = flow.weekday == target_weekday
+        totals = pd.Series(flow.total[in_weekday])
+        daily = totals.groupby(
+            [flow.date[in_weekday], flow.camera_id[in_weekday]]
+        ).sum().unstack()
+        daily_totals = daily.reindex(columns=camera_ids).to_numpy(dtype=float)
+        
+        # ratios[d, i, j] = total de j / total de i na data d, só onde ambas têm dados e i > 0
+        present = ~np.isnan(daily_totals)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = daily_totals[:, None, :] / daily_totals[:, :, None]
+        ratios[~(daily_totals[:, :, None] > 0) | ~present[:, None, :]] = np.nan
+        
+        # Precisa de pelo menos 2 datas comuns para razão confiável
+        common_dates = (present[:, :, None] & present[:, None, :]).sum(axis=0)
+        has_ratio = (~np.isnan(ratios)).sum(axis=0) > 0
+        ids = np.asarray(camera_ids)
+        keep = (common_dates >= 2) & has_ratio & (ids[:, None] != ids[None, :])
+        
+        # Usa mediana para robustez contra outliers
+        medians = np.nanmedian(ratios, axis=0) if len(daily_totals) else None
+        for i, j in zip(*np.nonzero(keep)):
+            camera_relationships[camera_ids[i]][camera_ids[j]] = medians[i, j]
         
         # Imprime resumo de relações
         cameras_with_relationships = len([c for c in camera_relationships if camera_relationships[c]])
@@ -491,57 +716,56 @@ class CameraDataImputer:
         Returns:
             Dicionário mapeando dia da semana (0-6) para fator relativo
         """
-        camera_data = self.flow_df[self.flow_df['camera_id'] == camera_id]
+        if self._weekday_factors is None:
+            self._weekday_factors = self._build_weekday_factors()
         
-        if len(camera_data) == 0:
-            return {i: 1.0 for i in range(7)}
+        return self._weekday_factors.get(camera_id, {i: 1.0 for i in range(7)})
+    
+    def _build_weekday_factors(self) -> Dict[int, Dict[int, float]]:
+        """
+        Calcula os fatores de dia da semana de todas as câmeras carregadas com um
+        único agrupamento por (câmera, dia da semana, hora).
+        """
+        flow = self.flow
+        
+        # Tráfego total de cada (câmera, dia da semana, hora) com dados
+        hourly = pd.Series(flow.total.astype(np.int64)).groupby(
+            [flow.camera_id, flow.weekday, flow.hour]
+        ).sum()
+        cameras = hourly.index.get_level_values(0).to_numpy()
+        weekdays = hourly.index.get_level_values(1).to_numpy(dtype=np.int64)
+        hours = hourly.index.get_level_values(2).to_numpy(dtype=np.int64)
+        
+        # Conta apenas horas ativas para cada dia
+        bounds = np.array([
+            self.get_camera_active_hours(camera_id, weekday)
+            for camera_id, weekday in zip(cameras.tolist(), weekdays.tolist())
+        ], dtype=np.int64).reshape(-1, 2)
+        active = (bounds[:, 0] <= hours) & (hours <= bounds[:, 1])
+        hourly = hourly[active]
+        
+        if hourly.empty:
+            return {}
         
-        # Calcula tráfego médio por dia da semana
-        weekday_totals = {}
-        weekday_counts = {}
+        # Tráfego médio por hora ativa, uma linha por câmera e uma coluna por dia da semana
+        per_weekday = hourly.groupby(level=[0, 1]).agg(['sum', 'size'])
+        weekday_avg_per_hour = (per_weekday['sum'] / per_weekday['size']).unstack().reindex(columns=range(7))
+        avg = weekday_avg_per_hour.to_numpy()
+        present = ~np.isnan(avg)
         
-        for weekday in range(7):
-            weekday_data = camera_data[camera_data['weekday'] == weekday]
-            if len(weekday_data) > 0:
-                # Conta apenas horas ativas para cada dia
-                total_traffic = 0
-                hour_count = 0
-                
-                for hour in range(24):
-                    hour_data = weekday_data[weekday_data['hour'] == hour]
-                    if not hour_data.empty:
-                        # Obtém horas ativas para esta câmera e dia da semana
-                        start_hour, end_hour = self.get_camera_active_hours(camera_id, weekday)
-                        if start_hour <= hour <= end_hour:
-                            total_traffic += hour_data['total_inside'].sum() + hour_data['total_outside'].sum()
-                            hour_count += 1
-                
-                if hour_count > 0:
-                    weekday_totals[weekday] = total_traffic
-                    weekday_counts[weekday] = hour_count
-        
-        # Normaliza para obter fatores relativos
-        if weekday_totals:
-            # Calcula tráfego médio por hora ativa para cada dia da semana
-            weekday_avg_per_hour = {wd: weekday_totals[wd]/weekday_counts[wd] 
-                                   for wd in weekday_totals if weekday_counts[wd] > 0}
-            
-            if weekday_avg_per_hour:
-                overall_avg = np.mean(list(weekday_avg_per_hour.values()))
-                weekday_factors = {wd: avg/overall_avg for wd, avg in weekday_avg_per_hour.items()}
-                
-                # Preenche dias da semana faltantes com o mais próximo disponível
-                for wd in range(7):
-                    if wd not in weekday_factors:
-                        # Encontra dia da semana mais próximo com dados
-                        distances = [(abs(wd - other_wd), other_wd) 
-                                    for other_wd in weekday_factors.keys()]
-                        _, nearest_wd = min(distances)
-                        weekday_factors[wd] = weekday_factors[nearest_wd]
-                        
-                return weekday_factors
+        # Normaliza pela média geral dos dias com dados
+        overall_avg = np.nansum(avg, axis=1, keepdims=True) / present.sum(axis=1, keepdims=True)
+        factors = avg / overall_avg
+        
+        # Preenche dias da semana faltantes com o mais próximo disponível (empate: o menor)
+        distance = np.abs(np.arange(7)[:, None] - np.arange(7)[None, :]).astype(float)
+        nearest = np.argmin(np.where(present[:, None, :], distance[None, :, :], np.inf), axis=2)
+        factors = np.take_along_axis(factors, nearest, axis=1)
         
-        return {i: 1.0 for i in range(7)}
+        return {
+            camera_id: dict(enumerate(row))
+            for camera_id, row in zip(weekday_avg_per_hour.index.tolist(), factors.tolist())
+        }
     
     def estimate_missing_data(self, failing_cameras: Dict[int, List[int]], 
                             target_date: datetime) -> pd.DataFrame:
@@ -553,30 +777,35 @@ class CameraDataImputer:
         2. Adiciona validação das estimativas
         3. Usa média ponderada quando múltiplas câmeras de referência
         """
-        print(f"\nEstimando dados ausentes para {target_date.date()}...")
+        log.info("\nEstimando dados ausentes para %s...", target_date.date())
         
         target_weekday = target_date.weekday()
+        # Linhas válidas do dia alvo, calculadas uma vez para todas as consultas de referência
+        target_day = np.datetime64(target_date.date(), 'D').astype(np.int32)
+        target_rows = (self.flow.date == target_day) & (self.flow.valid == 1)
         
         # DEBUG: Mostrar quais câmeras estão falhando
-        print(f"Câmeras com falha: {list(failing_cameras.keys())}")
+        log.debug("Câmeras com falha: %s", list(failing_cameras.keys()))
         
         # Primeiro, verifique se há câmeras funcionando disponíveis
         all_camera_ids = self.cameras_df['id'].tolist()
         working_cameras = [cam_id for cam_id in all_camera_ids if cam_id not in failing_cameras]
         
         if len(working_cameras) == 0:
-            print("⚠️  NENHUMA câmera funcionando disponível! Usando apenas dados históricos próprios.")
+            log.warning("⚠️  NENHUMA câmera funcionando disponível! Usando apenas dados históricos próprios.")
             # Usa apenas estimativa histórica própria
             return self._estimate_all_from_own_history(failing_cameras, target_date)
         
-        print(f"Câmeras funcionando disponíveis: {working_cameras}")
+        log.debug("Câmeras funcionando disponíveis: %s", working_cameras)
         
-        estimated_records = []
+        # Colunas dos registros estimados, montadas em um único DataFrame no final
+        record_hours, record_cameras, record_inside, record_outside = [], [], [], []
         
-        for camera_id, missing_hours in failing_cameras.items():
-            print(f"\n{'='*40}")
-            print(f"PROCESSANDO CÂMERA {camera_id}")
-            print(f"{'='*40}")
+        # Câmeras em ordem de id: o DataFrame sai pronto para insert_estimated_data
+        for camera_id, missing_hours in sorted(failing_cameras.items()):
+            log.debug("\n%s", '='*40)
+            log.debug("PROCESSANDO CÂMERA %s", camera_id)
+            log.debug("%s", '='*40)
             
             # Obtém intervalo de horas ativas
             start_hour, end_hour = self.get_camera_active_hours(camera_id, target_weekday)
@@ -586,14 +815,14 @@ class CameraDataImputer:
             if not missing_hours:
                 continue
             
-            print(f"Horas a estimar: {missing_hours}")
+            log.debug("Horas a estimar: %s", missing_hours)
             
             # Obter dados históricos da própria câmera como baseline
             own_history_estimates = self._get_own_history_baseline(camera_id, missing_hours, target_date)
-            print(f"Baseline histórico próprio: {own_history_estimates}")
+            log.debug("Baseline histórico próprio: %s", own_history_estimates)
             
             for hour in missing_hours:
-                print(f"\n  Hora {hour:02d}:")
+                log.debug("\n  Hora %02d:", hour)
                 
                 # Tentar usar câmeras de referência
                 reference_estimates = []
@@ -606,20 +835,16 @@ class CameraDataImputer:
                         continue
                     
                     # Verificar se tem dados para esta hora
-                    other_hour_data = self.flow_df[
-                        (self.flow_df['camera_id'] == other_id) &
-                        (self.flow_df['date'] == target_date.date()) &
-                        (self.flow_df['hour'] == hour) &
-                        (self.flow_df['valid'] == 1)
-                    ]
+                    other_rows = np.flatnonzero(
+                        target_rows & (self.flow.camera_id == other_id) & (self.flow.hour == hour)
+                    )
                     
-                    if other_hour_data.empty:
+                    if not len(other_rows):
                         continue
                     
-                    other_row = other_hour_data.iloc[0]
-                    other_inside = other_row['total_inside']
-                    other_outside = other_row['total_outside']
-                    other_total = other_inside + other_outside
+                    other_inside = self.flow.inside[other_rows[0]]
+                    other_outside = self.flow.outside[other_rows[0]]
+                    other_total = self.flow.total[other_rows[0]]
                     
                     # Calcular razão histórica CORRETAMENTE
                     hist_ratio = self._get_hourly_ratio(camera_id, other_id, hour, target_weekday)
@@ -632,10 +857,10 @@ class CameraDataImputer:
                         estimated_inside = int(other_inside / hist_ratio)
                         estimated_outside = int(other_outside / hist_ratio)
                         
-                        print(f"    Referência Câmera {other_id}:")
-                        print(f"      Valores: {other_inside}/{other_outside}")
-                        print(f"      Razão histórica: {hist_ratio:.3f}")
-                        print(f"      Estimativa: {estimated_inside}/{estimated_outside}")
+                        log.debug("    Referência Câmera %s:", other_id)
+                        log.debug("      Valores: %s/%s", other_inside, other_outside)
+                        log.debug("      Razão histórica: %.3f", hist_ratio)
+                        log.debug("      Estimativa: %s/%s", estimated_inside, estimated_outside)
                         
                         reference_estimates.append((estimated_inside, estimated_outside))
                         
@@ -656,26 +881,32 @@ class CameraDataImputer:
                 )
                 
                 # Criar registro
-                hour_timestamp = datetime(
-                    target_date.year, target_date.month, target_date.day, hour
-                )
+                record_hours.append(hour)
+                record_cameras.append(camera_id)
+                record_inside.append(final_inside)
+                record_outside.append(final_outside)
                 
-                record = {
-                    'created_at': hour_timestamp,
-                    'camera_id': camera_id,
-                    'total_inside': final_inside,
-                    'total_outside': final_outside,
-                    'valid': 1,
-                    'estimated': 1,
-                    'client': self.cameras_df[self.cameras_df['id'] == camera_id]['client'].iloc[0],
-                    'location': self.cameras_df[self.cameras_df['id'] == camera_id]['location'].iloc[0]
-                }
-                
-                estimated_records.append(record)
-                
-                print(f"    ✅ Estimativa final: {final_inside}/{final_outside}")
+                log.debug("    ✅ Estimativa final: %s/%s", final_inside, final_outside)
         
-        return pd.DataFrame(estimated_records)
+        return self._records_frame(target_date, record_hours, record_cameras, record_inside, record_outside)
+
+    def _records_frame(self, target_date: datetime, hours: List[int], camera_ids: List[int],
+                       inside: List[int], outside: List[int]) -> pd.DataFrame:
+        """Monta o DataFrame de registros estimados a partir das colunas acumuladas."""
+        # Timestamps de todos os registros de uma vez: meia-noite do dia alvo + hora
+        timestamps = pd.Timestamp(target_date.date()) + pd.to_timedelta(np.asarray(hours, dtype=np.int64), unit='h')
+        clients = [self._camera_info[camera_id]['client'] for camera_id in camera_ids]
+        locations = [self._camera_info[camera_id]['location'] for camera_id in camera_ids]
+        return pd.DataFrame({
+            'created_at': timestamps,
+            'camera_id': np.asarray(camera_ids, dtype=np.int32),
+            'total_inside': np.asarray(inside, dtype=np.int32),
+            'total_outside': np.asarray(outside, dtype=np.int32),
+            'valid': 1,
+            'estimated': 1,
+            'client': pd.Categorical(clients),
+            'location': pd.Categorical(locations),
+        })
 
     def _get_own_history_baseline(self, camera_id: int, missing_hours: List[int], 
                                 target_date: datetime) -> Dict[int, Tuple[int, int]]:
@@ -687,11 +918,7 @@ class CameraDataImputer:
         baseline = {}
         
         for hour in missing_hours:
-            hist_data = self.flow_df[
-                (self.flow_df['camera_id'] == camera_id) &
-                (self.flow_df['hour'] == hour) &
-                (self.flow_df['weekday'] == target_weekday)
-            ]
+            hist_data = self._history_rows(camera_id, target_weekday, hour)
             
             if len(hist_data) >= 2:
                 avg_inside = hist_data['total_inside'].mean()
@@ -704,102 +931,9 @@ class CameraDataImputer:
         
         return baseline
 
-    def _get_hourly_ratio(self, camera_a: int, camera_b: int, hour: int, weekday: int) -> float:
-        """
-        Obtém razão histórica entre duas câmeras para hora e dia da semana específicos.
-        
-        RETORNA: camera_b_total / camera_a_total
-        Se ratio = 2.0, camera_b tem 2x mais movimento que camera_a
-        """
-        # Obtém dados históricos para ambas as câmeras
-        data_a = self.flow_df[
-            (self.flow_df['camera_id'] == camera_a) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
-        
-        data_b = self.flow_df[
-            (self.flow_df['camera_id'] == camera_b) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
-        
-        if len(data_a) == 0 or len(data_b) == 0:
-            return 0
-        
-        # Encontra datas comuns
-        dates_a = set(data_a['date'].unique())
-        dates_b = set(data_b['date'].unique())
-        common_dates = dates_a & dates_b
-        
-        if len(common_dates) < 2:
-            return 0
-        
-        # Calcula razões para datas comuns
-        ratios = []
-        for date in common_dates:
-            total_a = (data_a[data_a['date'] == date]['total_inside'].sum() + 
-                    data_a[data_a['date'] == date]['total_outside'].sum())
-            total_b = (data_b[data_b['date'] == date]['total_inside'].sum() + 
-                    data_b[data_b['date'] == date]['total_outside'].sum())
-            
-            if total_a > 0:
-                ratio = total_b / total_a
-                # Verificar se ratio é razoável (evitar outliers)
-                if 0.1 < ratio < 10:  # Limites razoáveis
-                    ratios.append(ratio)
-        
-        if not ratios:
-            return 0
-        
-        # DEBUG: Mostrar estatísticas da razão
-        print(f"      Razões calculadas: {len(ratios)} valores")
-        print(f"      Média: {np.mean(ratios):.3f}, Mediana: {np.median(ratios):.3f}")
-        print(f"      Min: {np.min(ratios):.3f}, Max: {np.max(ratios):.3f}")
-        
-        return np.median(ratios)
-
     def _get_ratio_confidence(self, camera_a: int, camera_b: int, hour: int, weekday: int) -> float:
         """Calcula confiança na razão histórica (0-1)."""
-        data_a = self.flow_df[
-            (self.flow_df['camera_id'] == camera_a) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
-        
-        data_b = self.flow_df[
-            (self.flow_df['camera_id'] == camera_b) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
-        
-        dates_a = set(data_a['date'].unique())
-        dates_b = set(data_b['date'].unique())
-        common_dates = dates_a & dates_b
-        
-        if len(common_dates) < 2:
-            return 0
-        
-        # Confiança baseada no número de datas comuns
-        confidence = min(len(common_dates) / 10, 1.0)  # Máximo 1.0
-        
-        # Penalizar se a variação for muito grande
-        ratios = []
-        for date in common_dates:
-            total_a = (data_a[data_a['date'] == date]['total_inside'].sum() + 
-                    data_a[data_a['date'] == date]['total_outside'].sum())
-            total_b = (data_b[data_b['date'] == date]['total_inside'].sum() + 
-                    data_b[data_b['date'] == date]['total_outside'].sum())
-            
-            if total_a > 0:
-                ratios.append(total_b / total_a)
-        
-        if len(ratios) >= 3:
-            cv = np.std(ratios) / np.mean(ratios)  # Coeficiente de variação
-            if cv > 0.5:  # Variação muito alta
-                confidence *= 0.5
-        
-        return confidence
+        return self._ratio_stats(camera_a, camera_b, hour, weekday)[1]
 
     def _combine_estimates(self, reference_estimates: List[Tuple[int, int]], 
                         reference_weights: List[float],
@@ -816,11 +950,15 @@ class CameraDataImputer:
         if total_weight == 0:
             return own_history_estimate
         
-        normalized_weights = [w/total_weight for w in reference_weights]
-        
-        # Calcular média ponderada
-        weighted_inside = sum(est[0] * weight for est, weight in zip(reference_estimates, normalized_weights))
-        weighted_outside = sum(est[1] * weight for est, weight in zip(reference_estimates, normalized_weights))
+        if len(reference_estimates) == 1:
+            # Uma única referência: a média ponderada é a própria estimativa
+            weighted_inside, weighted_outside = reference_estimates[0]
+        else:
+            # Calcular média ponderada das duas colunas de uma vez (soma na ordem das
+            # referências, como a soma Python, para não mudar o arredondamento)
+            estimates = np.asarray(reference_estimates, dtype=np.float64)
+            normalized_weights = np.asarray(reference_weights, dtype=np.float64) / total_weight
+            weighted_inside, weighted_outside = (estimates * normalized_weights[:, None]).sum(axis=0).tolist()
         
         # Se tivermos estimativa própria, fazer média ponderada com ela também
         if own_history_estimate != (0, 0):
@@ -837,29 +975,13 @@ class CameraDataImputer:
                             camera_id: int, hour: int, weekday: int) -> Tuple[int, int]:
         """Aplica verificações de sanidade às estimativas."""
         
-        # 1. Obter estatísticas históricas para limites
-        hist_data = self.flow_df[
-            (self.flow_df['camera_id'] == camera_id) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
+        # 1. Obter limites históricos (IQR) pré-calculados para esta chave
+        if self._sanity_bounds is None:
+            self._sanity_bounds = self._build_sanity_bounds()
+        bounds = self._sanity_bounds.get((camera_id, weekday, hour))
         
-        if len(hist_data) >= 3:
-            hist_inside = hist_data['total_inside']
-            hist_outside = hist_data['total_outside']
-            
-            # Calcular percentis
-            inside_q1 = hist_inside.quantile(0.25)
-            inside_q3 = hist_inside.quantile(0.75)
-            inside_iqr = inside_q3 - inside_q1
-            inside_lower = max(0, inside_q1 - 1.5 * inside_iqr)
-            inside_upper = inside_q3 + 1.5 * inside_iqr
-            
-            outside_q1 = hist_outside.quantile(0.25)
-            outside_q3 = hist_outside.quantile(0.75)
-            outside_iqr = outside_q3 - outside_q1
-            outside_lower = max(0, outside_q1 - 1.5 * outside_iqr)
-            outside_upper = outside_q3 + 1.5 * outside_iqr
+        if bounds is not None:
+            inside_lower, inside_upper, outside_lower, outside_upper = bounds
             
             # Aplicar limites
             estimated_inside = int(max(inside_lower, min(estimated_inside, inside_upper)))
@@ -878,24 +1000,47 @@ class CameraDataImputer:
         
         return estimated_inside, estimated_outside
 
+    def _build_sanity_bounds(self) -> Dict[Tuple[int, int, int], Tuple[float, float, float, float]]:
+        """
+        Calcula, com um único agrupamento, os limites IQR de entrada e saída de cada
+        (câmera, dia da semana, hora) com ao menos 3 registros históricos.
+        
+        Returns:
+            Dicionário (câmera, dia da semana, hora) -> (entrada_min, entrada_max, saída_min, saída_max)
+        """
+        flow = self.flow
+        grouped = pd.DataFrame({'inside': flow.inside, 'outside': flow.outside}).groupby(
+            [flow.camera_id, flow.weekday, flow.hour]
+        )
+        enough = (grouped.size() >= 3).to_numpy()
+        q1 = grouped.quantile(0.25)[enough]
+        q3 = grouped.quantile(0.75)[enough]
+        
+        iqr = q3 - q1
+        lower = np.maximum(0, q1 - 1.5 * iqr)
+        upper = q3 + 1.5 * iqr
+        
+        return dict(zip(
+            q1.index.tolist(),
+            zip(lower['inside'].tolist(), upper['inside'].tolist(),
+                lower['outside'].tolist(), upper['outside'].tolist())
+        ))
+
     def _estimate_all_from_own_history(self, failing_cameras: Dict[int, List[int]], 
                                     target_date: datetime) -> pd.DataFrame:
         """Estima todas as câmeras apenas com dados históricos próprios."""
-        print("USANDO APENAS DADOS HISTÓRICOS PRÓPRIOS")
+        log.info("USANDO APENAS DADOS HISTÓRICOS PRÓPRIOS")
         
-        estimated_records = []
+        record_hours, record_cameras, record_inside, record_outside = [], [], [], []
         target_weekday = target_date.weekday()
         
-        for camera_id, missing_hours in failing_cameras.items():
+        # Câmeras em ordem de id: o DataFrame sai pronto para insert_estimated_data
+        for camera_id, missing_hours in sorted(failing_cameras.items()):
             weekday_factors = self._get_weekday_patterns(camera_id)
             target_factor = weekday_factors[target_weekday]
             
             for hour in missing_hours:
-                hist_data = self.flow_df[
-                    (self.flow_df['camera_id'] == camera_id) &
-                    (self.flow_df['hour'] == hour) &
-                    (self.flow_df['weekday'] == target_weekday)
-                ]
+                hist_data = self._history_rows(camera_id, target_weekday, hour)
                 
                 if len(hist_data) >= 2:
                     avg_inside = hist_data['total_inside'].mean()
@@ -906,10 +1051,7 @@ class CameraDataImputer:
                 else:
                     # Sem dados históricos suficientes
                     # Usar média de horas ativas similares
-                    similar_hours = self.flow_df[
-                        (self.flow_df['camera_id'] == camera_id) &
-                        (self.flow_df['weekday'] == target_weekday)
-                    ]
+                    similar_hours = self._history_rows(camera_id, target_weekday)
                     
                     if len(similar_hours) > 0:
                         estimated_inside = int(similar_hours['total_inside'].mean() * target_factor)
@@ -924,45 +1066,29 @@ class CameraDataImputer:
                     estimated_inside, estimated_outside, camera_id, hour, target_weekday
                 )
                 
-                hour_timestamp = datetime(
-                    target_date.year, target_date.month, target_date.day, hour
-                )
+                record_hours.append(hour)
+                record_cameras.append(camera_id)
+                record_inside.append(estimated_inside)
+                record_outside.append(estimated_outside)
                 
-                record = {
-                    'created_at': hour_timestamp,
-                    'camera_id': camera_id,
-                    'total_inside': estimated_inside,
-                    'total_outside': estimated_outside,
-                    'valid': 1,
-                    'estimated': 1,
-                    'client': self.cameras_df[self.cameras_df['id'] == camera_id]['client'].iloc[0],
-                    'location': self.cameras_df[self.cameras_df['id'] == camera_id]['location'].iloc[0]
-                }
-                
-                estimated_records.append(record)
-                
-                print(f"Câmera {camera_id}, Hora {hour:02d}: {estimated_inside}/{estimated_outside}")
+                log.debug("Câmera %s, Hora %02d: %s/%s", camera_id, hour, estimated_inside, estimated_outside)
         
-        return pd.DataFrame(estimated_records)
+        return self._records_frame(target_date, record_hours, record_cameras, record_inside, record_outside)
 
     def _estimate_from_own_history(self, camera_id: int, missing_hours: List[int], 
                                   target_date: datetime, target_factor: float,
                                   estimated_records: List[Dict]):
         """Estima dados usando padrões históricos da própria câmera."""
-        print(f"  Usando padrões históricos para Câmera {camera_id}")
+        log.debug("  Usando padrões históricos para Câmera %s", camera_id)
         
         target_weekday = target_date.weekday()
-        camera_info = self.cameras_df[self.cameras_df['id'] == camera_id].iloc[0]
+        camera_info = self._camera_info[camera_id]
         client = camera_info['client']
         location = camera_info['location']
         
         for hour in missing_hours:
             # Obtém média histórica para esta câmera, hora e dia da semana
-            hist_data = self.flow_df[
-                (self.flow_df['camera_id'] == camera_id) &
-                (self.flow_df['hour'] == hour) &
-                (self.flow_df['weekday'] == target_weekday)
-            ]
+            hist_data = self._history_rows(camera_id, target_weekday, hour)
             
             if len(hist_data) >= 2:  # Precisa de pelo menos 2 pontos históricos
                 # Calcula média entrada/saída
@@ -994,25 +1120,21 @@ class CameraDataImputer:
                 }
                 
                 estimated_records.append(record)
-                print(f"  Hora {hour:02d}: Estimativa histórica {estimated_inside} entrada, {estimated_outside} saída")
+                log.debug("  Hora %02d: Estimativa histórica %s entrada, %s saída", hour, estimated_inside, estimated_outside)
             else:
-                print(f"  Hora {hour:02d}: Dados históricos insuficientes")
+                log.debug("  Hora %02d: Dados históricos insuficientes", hour)
     
     def _estimate_hour_from_history(self, camera_id: int, hour: int, 
                                    target_date: datetime, target_factor: float,
                                    estimated_records: List[Dict]):
         """Estima hora única a partir do histórico da própria câmera."""
         target_weekday = target_date.weekday()
-        camera_info = self.cameras_df[self.cameras_df['id'] == camera_id].iloc[0]
+        camera_info = self._camera_info[camera_id]
         client = camera_info['client']
         location = camera_info['location']
         
         # Obtém média histórica para esta câmera, hora e dia da semana
-        hist_data = self.flow_df[
-            (self.flow_df['camera_id'] == camera_id) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == target_weekday)
-        ]
+        hist_data = self._history_rows(camera_id, target_weekday, hour)
         
         if len(hist_data) >= 2:
             avg_inside = hist_data['total_inside'].mean()
@@ -1041,79 +1163,64 @@ class CameraDataImputer:
             }
             
             estimated_records.append(record)
-            print(f"  Hora {hour:02d}: Fallback histórico {estimated_inside} entrada, {estimated_outside} saída")
+            log.debug("  Hora %02d: Fallback histórico %s entrada, %s saída", hour, estimated_inside, estimated_outside)
         else:
-            print(f"  Hora {hour:02d}: Nenhum dado disponível para estimativa")
+            log.debug("  Hora %02d: Nenhum dado disponível para estimativa", hour)
     
-    def _get_hourly_ratio(self, camera_a: int, camera_b: int, hour: int, weekday: int) -> float:
-        """Obtém razão histórica entre duas câmeras para hora e dia da semana específicos."""
-        # Obtém dados históricos para ambas as câmeras
-        data_a = self.flow_df[
-            (self.flow_df['camera_id'] == camera_a) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
-        
-        data_b = self.flow_df[
-            (self.flow_df['camera_id'] == camera_b) &
-            (self.flow_df['hour'] == hour) &
-            (self.flow_df['weekday'] == weekday)
-        ]
+    def _compute_ratio_stats(self, camera_a: int, camera_b: int, hour: int, weekday: int) -> Tuple[float, float]:
+        """
+        Calcula, em uma única passada pelas datas comuns, a razão histórica
+        camera_b / camera_a (mediana) e a confiança nessa razão (0-1).
+        Chamado via self._ratio_stats, que guarda o resultado por chave.
         
-        if len(data_a) == 0 or len(data_b) == 0:
-            return 0
+        Returns:
+            Tupla de (razão, confiança); (0, 0) sem ao menos 2 datas comuns
+        """
+        # Totais diários de ambas as câmeras, com os dias ordenados
+        dates_a, totals_a = self._daily_totals(camera_a, weekday, hour)
+        dates_b, totals_b = self._daily_totals(camera_b, weekday, hour)
         
-        # Encontra datas comuns
-        dates_a = set(data_a['date'].unique())
-        dates_b = set(data_b['date'].unique())
-        common_dates = dates_a & dates_b
+        # Encontra datas comuns (os dias já vêm únicos de _daily_totals)
+        common_dates, idx_a, idx_b = np.intersect1d(
+            dates_a, dates_b, assume_unique=True, return_indices=True
+        )
         
         if len(common_dates) < 2:
-            return 0
+            return 0, 0
         
-        # Calcula razões para datas comuns
-        ratios = []
-        for date in common_dates:
-            total_a = (data_a[data_a['date'] == date]['total_inside'].sum() + 
-                      data_a[data_a['date'] == date]['total_outside'].sum())
-            total_b = (data_b[data_b['date'] == date]['total_inside'].sum() + 
-                      data_b[data_b['date'] == date]['total_outside'].sum())
-            
-            if total_a > 0:
-                ratios.append(total_b / total_a)
+        # Calcula razões para datas comuns em que camera_a teve movimento
+        totals_a = totals_a[idx_a]
+        totals_b = totals_b[idx_b]
+        moved = totals_a > 0
+        ratios = totals_b[moved] / totals_a[moved]
+        
+        # Confiança baseada no número de datas comuns
+        confidence = min(len(common_dates) / 10, 1.0)  # Máximo 1.0
+        
+        # Penalizar se a variação for muito grande
+        if len(ratios) >= 3:
+            cv = np.std(ratios) / np.mean(ratios)  # Coeficiente de variação
+            if cv > 0.5:  # Variação muito alta
+                confidence *= 0.5
         
-        return np.median(ratios) if ratios else 0
+        return (np.median(ratios) if len(ratios) else 0), confidence
     
-    def convert_timestamp_for_sqlite(self, timestamp_value):
+    def _get_hourly_ratio(self, camera_a: int, camera_b: int, hour: int, weekday: int) -> float:
         """
-        Converte pandas Timestamp, Python datetime ou string para string compatível com SQLite.
+        Obtém razão histórica entre duas câmeras para hora e dia da semana específicos.
+        
+        RETORNA: camera_b_total / camera_a_total
+        Se ratio = 2.0, camera_b tem 2x mais movimento que camera_a
         """
-        if pd.isna(timestamp_value):
-            return None
-        elif isinstance(timestamp_value, pd.Timestamp):
-            return timestamp_value.strftime('%Y-%m-%d %H:%M:%S')
-        elif isinstance(timestamp_value, datetime):
-            return timestamp_value.strftime('%Y-%m-%d %H:%M:%S')
-        elif isinstance(timestamp_value, str):
-            # Verifica se já está no formato correto
-            try:
-                datetime.strptime(timestamp_value, '%Y-%m-%d %H:%M:%S')
-                return timestamp_value
-            except ValueError:
-                # Tenta converter se estiver em outro formato
-                try:
-                    dt = pd.to_datetime(timestamp_value)
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    return timestamp_value
-        else:
-            return str(timestamp_value)
+        return self._ratio_stats(camera_a, camera_b, hour, weekday)[0]
     
     def insert_estimated_data(self, estimated_df: pd.DataFrame) -> Tuple[int, int]:
         """
         Insere dados estimados no banco de dados.
         
         CORREÇÃO: Lida corretamente com múltiplas câmeras no mesmo datetime.
+        Os registros são gravados na ordem recebida (por camera_id, como montados
+        em estimate_missing_data).
         
         Returns:
             Tupla de (inserted_count, updated_count)
@@ -1122,69 +1229,64 @@ class CameraDataImputer:
             print("\nNenhum dado estimado para inserir.")
             return 0, 0
         
-        cursor = self.conn.cursor()
-        
-        inserted_count = 0
-        updated_count = 0
         skipped_count = 0
         
-        # Ordena por camera_id para consistência
-        estimated_df = estimated_df.sort_values('camera_id')
-        
         print(f"Processando {len(estimated_df)} registros estimados...")
         
-        for i, (_, row) in enumerate(estimated_df.iterrows(), 1):
-            # Converte Timestamp para string compatível com SQLite
-            created_at_sql = self.convert_timestamp_for_sqlite(row['created_at'])
-            camera_id = int(row['camera_id'])
-            
-            if i % 100 == 0:  # Log de progresso
-                print(f"  Processando registro {i}/{len(estimated_df)}...")
+        # Converte toda a coluna para string compatível com SQLite; NaT vira NULL
+        created_at_sql = pd.to_datetime(estimated_df['created_at'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+        created_at_sql = created_at_sql.astype(object).where(created_at_sql.notna(), None)
+        
+        # Colunas extraídas uma vez; tolist() devolve ints Python, que o sqlite3 aceita
+        rows = list(zip(
+            estimated_df['camera_id'].to_numpy(dtype=np.int64).tolist(),
+            created_at_sql.tolist(),
+            estimated_df['total_inside'].to_numpy(dtype=np.int64).tolist(),
+            estimated_df['total_outside'].to_numpy(dtype=np.int64).tolist()
+        ))
+        
+        # Todas as escritas em uma única transação: os registros vão para uma tabela
+        # temporária e o banco é atualizado com dois comandos sobre o conjunto todo
+        with self._txn() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS _stage (
+                    camera_id INTEGER,
+                    created_at TEXT,
+                    total_inside INTEGER,
+                    total_outside INTEGER
+                )
+            """)
+            cursor.execute("DELETE FROM _stage")
+            cursor.executemany("INSERT INTO _stage VALUES (?, ?, ?, ?)", rows)
             
-            try:
-                # Verifica se registro já existe (combinando camera_id E created_at)
-                cursor.execute("""
-                    SELECT id, valid FROM peopleflowtotals 
-                    WHERE camera_id = ? AND created_at = ?
-                """, (camera_id, created_at_sql))
-                
-                existing = cursor.fetchone()
-                
-                if existing is None:
-                        cursor.execute("""
-                            INSERT INTO peopleflowtotals 
-                            (created_at, camera_id, total_inside, total_outside, valid)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            created_at_sql,
-                            camera_id,
-                            int(row['total_inside']),
-                            int(row['total_outside']),
-                            1  # Marca como válido
-                        ))
-                        inserted_count += 1        
-                else:
-                    # Atualiza registro inválido existente
-                    existing_id, _ = existing
-                    cursor.execute("""
-                        UPDATE peopleflowtotals 
-                        SET total_inside = ?, total_outside = ?, valid = 1
-                        WHERE id = ?
-                    """, (
-                        int(row['total_inside']),
-                        int(row['total_outside']),
-                        existing_id
-                    ))
-                    updated_count += 1
+            # Atualiza o primeiro registro existente de cada (camera_id, created_at)
+            cursor.execute("""
+                UPDATE peopleflowtotals 
+                SET total_inside = s.total_inside, total_outside = s.total_outside, valid = 1
+                FROM (
+                    SELECT MIN(p.id) AS id, s.total_inside, s.total_outside
+                    FROM _stage s
+                    JOIN peopleflowtotals p 
+                      ON p.camera_id = s.camera_id AND p.created_at = s.created_at
+                    GROUP BY s.rowid
+                ) AS s
+                WHERE peopleflowtotals.id = s.id
+            """)
+            updated_count = cursor.rowcount
             
-            except Exception as e:
-                print(f"\n❌ Erro processando registro {i}:")
-                print(f"   Câmera: {camera_id}, Data/hora: {created_at_sql}")
-                print(f"   Erro: {e}")
-                # Continua com próximo registro
-                continue
-        
-        self.conn.commit()
+            # Insere, na ordem da tabela temporária, os que ainda não existem
+            cursor.execute("""
+                INSERT INTO peopleflowtotals 
+                (created_at, camera_id, total_inside, total_outside, valid)
+                SELECT s.created_at, s.camera_id, s.total_inside, s.total_outside, 1
+                FROM _stage s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM peopleflowtotals p 
+                    WHERE p.camera_id = s.camera_id AND p.created_at = s.created_at
+                )
+                ORDER BY s.rowid
+            """)
+            inserted_count = cursor.rowcount
         
         print(f"\nResumo da inserção:")
         print(f"  ✅ Inseridos: {inserted_count} novos registros")
@@ -1197,49 +1299,47 @@ class CameraDataImputer:
                             estimated_df: pd.DataFrame, inserted: int, updated: int):
         """Cria entrada de log para o processo de imputação."""
         try:
-            cursor = self.conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS data_imputation_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    imputation_date TIMESTAMP,
-                    client TEXT,
-                    location TEXT,
-                    target_date DATE,
-                    target_weekday INTEGER,
-                    cameras_affected INTEGER,
-                    hours_estimated INTEGER,
-                    records_inserted INTEGER,
-                    records_updated INTEGER,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            with self._txn() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS data_imputation_log (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        imputation_date TIMESTAMP,
+                        client TEXT,
+                        location TEXT,
+                        target_date DATE,
+                        target_weekday INTEGER,
+                        cameras_affected INTEGER,
+                        hours_estimated INTEGER,
+                        records_inserted INTEGER,
+                        records_updated INTEGER,
+                        notes TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
             
-            cameras_affected = len(estimated_df['camera_id'].unique())
-            hours_estimated = len(estimated_df)
+                cameras_affected = len(estimated_df['camera_id'].unique())
+                hours_estimated = len(estimated_df)
             
-            notes = f"Imputados dados para {cameras_affected} câmeras, {hours_estimated} horas"
+                notes = f"Imputados dados para {cameras_affected} câmeras, {hours_estimated} horas"
             
-            cursor.execute("""
-                INSERT INTO data_imputation_log 
-                (imputation_date, client, location, target_date, target_weekday,
-                 cameras_affected, hours_estimated, records_inserted, records_updated, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                client,
-                location,
-                target_date.strftime('%Y-%m-%d'),
-                target_date.weekday(),
-                cameras_affected,
-                hours_estimated,
-                inserted,
-                updated,
-                notes
-            ))
+                cursor.execute("""
+                    INSERT INTO data_imputation_log 
+                    (imputation_date, client, location, target_date, target_weekday,
+                     cameras_affected, hours_estimated, records_inserted, records_updated, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    client,
+                    location,
+                    target_date.strftime('%Y-%m-%d'),
+                    target_date.weekday(),
+                    cameras_affected,
+                    hours_estimated,
+                    inserted,
+                    updated,
+                    notes
+                ))
             
-            self.conn.commit()
             print("Log de imputação criado com sucesso.")
         except Exception as e:
             print(f"Nota: Não foi possível criar log de imputação: {e}")
@@ -1278,7 +1378,6 @@ class CameraDataImputer:
         
         if target_date is None:
             print("Nenhum dado válido encontrado. Pulando este cliente-localização.")
-            self.disconnect()
             return results
         
         # Identifica câmeras com falha
@@ -1287,7 +1386,6 @@ class CameraDataImputer:
         
         if not failing_cameras:
             print("\nNenhuma câmera com falha detectada. Nada a fazer.")
-            self.disconnect()
             results['success'] = True
             return results
         
@@ -1297,7 +1395,6 @@ class CameraDataImputer:
         
         if estimated_data.empty:
             print("\nNão foi possível estimar nenhum dado ausente.")
-            self.disconnect()
             results['success'] = True
             return results
         
@@ -1310,18 +1407,18 @@ class CameraDataImputer:
         if inserted > 0 or updated > 0:
             self.create_imputation_log(client, location, target_date, estimated_data, inserted, updated)
         
-        # Limpeza
-        self.disconnect()
         results['success'] = True
         
         return results
     
-    def run_imputation(self, days_back: int = 45):
+    def run_imputation(self, days_back: int = 45, max_workers: int = 1):
         """
         Método principal para executar o processo completo de imputação para todos clientes-localizações.
         
         Args:
             days_back: Número de dias para usar dados históricos
+            max_workers: Processos para tratar os pares em paralelo (1 = sequencial,
+                com leitura única de câmeras e fluxo para todos os pares)
         """
         print("=" * 60)
         print("SISTEMA DE IMPUTAÇÃO DE DADOS DE CÂMERAS")
@@ -1336,65 +1433,107 @@ class CameraDataImputer:
         
         print(f"\nEncontrados {len(client_locations)} pares cliente-localização para processar")
         
-        all_results = []
+        # Totais acumulados à medida que cada par termina; os resultados não são guardados
+        totals = dict.fromkeys([
+            'cameras_loaded', 'failing_cameras', 'hours_estimated', 'records_inserted', 'records_updated'
+        ], 0)
         successful_count = 0
         
-        # Processa cada cliente-localização sequencialmente
-        for i, (client, location) in enumerate(client_locations, 1):
-            print(f"\n{'='*60}")
-            print(f"Processando {i}/{len(client_locations)}: {client} - {location}")
-            print(f"{'='*60}")
+        for result in self._iter_results(client_locations, days_back, max_workers):
+            # Resultados de erro não têm contagens
+            for key in totals:
+                totals[key] += result.get(key, 0)
+            successful_count += bool(result['success'])
+        
+        # Imprime resumo final em uma única escrita
+        print(
+            "\n" + "=" * 60,
+            "PROCESSAMENTO CONCLUÍDO",
+            "=" * 60,
+            f"\nResumo Geral:",
+            f"  Clientes-localizações processados: {len(client_locations)}",
+            f"  Processados com sucesso: {successful_count}",
+            f"  Total de câmeras carregadas: {totals['cameras_loaded']}",
+            f"  Total de câmeras com falha: {totals['failing_cameras']}",
+            f"  Total de horas estimadas: {totals['hours_estimated']}",
+            f"  Total de registros inseridos: {totals['records_inserted']}",
+            f"  Total de registros atualizados: {totals['records_updated']}",
+            sep="\n"
+        )
+
+    def _iter_results(self, client_locations: List[Tuple[str, str]], days_back: int, max_workers: int):
+        """
+        Processa os pares cliente-localização e devolve o resultado de cada um
+        assim que fica pronto (em paralelo se max_workers > 1).
+        """
+        if max_workers > 1 and len(client_locations) > 1:
+            # Um processo por par, cada um com sua própria conexão; o WAL permite
+            # leituras concorrentes e as escritas de cada par são uma única transação.
+            # Cada processo recebe o mesmo nível de log do processo principal
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(client_locations)),
+                initializer=_init_worker_logging,
+                initargs=(logging.getLogger().getEffectiveLevel(),),
+            ) as executor:
+                futures = {
+                    executor.submit(_process_one, self.db_path, client, location, days_back): (client, location)
+                    for client, location in client_locations
+                }
+                for i, future in enumerate(as_completed(futures), 1):
+                    client, location = futures[future]
+                    yield self._run_and_report(i, len(client_locations), client, location, future.result)
+        else:
+            # Uma única leitura de câmeras e fluxo para todos os pares
+            self.preload_client_locations(client_locations, days_back)
             
-            try:
-                # Processa este cliente-localização
-                result = self.process_client_location(client, location, days_back)
-                all_results.append(result)
-                
-                if result['success']:
-                    successful_count += 1
-                    print(f"\n✓ Processado com sucesso {client} - {location}")
-                else:
-                    print(f"\n✗ Falha ao processar {client} - {location}")
-                
-                # Imprime resumo para este cliente-localização
-                print(f"\nResumo para {client} - {location}:")
-                print(f"  Câmeras carregadas: {result['cameras_loaded']}")
-                print(f"  Câmeras com falha: {result['failing_cameras']}")
-                print(f"  Horas estimadas: {result['hours_estimated']}")
-                print(f"  Registros inseridos: {result['records_inserted']}")
-                print(f"  Registros atualizados: {result['records_updated']}")
-                
-            except Exception as e:
-                print(f"\n✗ Erro processando {client} - {location}: {e}")
-                import traceback
-                traceback.print_exc()
-                # Adiciona resultado de erro
-                all_results.append({
-                    'client': client,
-                    'location': location,
-                    'success': False,
-                    'error': str(e)
-                })
-        
-        # Imprime resumo final
-        print("\n" + "=" * 60)
-        print("PROCESSAMENTO CONCLUÍDO")
-        print("=" * 60)
+            # Processa cada cliente-localização sequencialmente
+            for i, (client, location) in enumerate(client_locations, 1):
+                yield self._run_and_report(
+                    i, len(client_locations), client, location,
+                    partial(self.process_client_location, client, location, days_back)
+                )
+
+    def _run_and_report(self, i: int, total: int, client: str, location: str, run) -> Dict:
+        """
+        Executa o processamento de um par (run devolve o dicionário de resultados)
+        e imprime o resumo; erros viram um resultado com success=False.
+        """
+        print(f"\n{'='*60}", f"Processando {i}/{total}: {client} - {location}", f"{'='*60}", sep="\n")
         
-        total_cameras = sum(r.get('cameras_loaded', 0) for r in all_results)
-        total_failing = sum(r.get('failing_cameras', 0) for r in all_results)
-        total_hours = sum(r.get('hours_estimated', 0) for r in all_results)
-        total_inserted = sum(r.get('records_inserted', 0) for r in all_results)
-        total_updated = sum(r.get('records_updated', 0) for r in all_results)
-        
-        print(f"\nResumo Geral:")
-        print(f"  Clientes-localizações processados: {len(client_locations)}")
-        print(f"  Processados com sucesso: {successful_count}")
-        print(f"  Total de câmeras carregadas: {total_cameras}")
-        print(f"  Total de câmeras com falha: {total_failing}")
-        print(f"  Total de horas estimadas: {total_hours}")
-        print(f"  Total de registros inseridos: {total_inserted}")
-        print(f"  Total de registros atualizados: {total_updated}")
+        try:
+            # Processa este cliente-localização
+            result = run()
+            
+            if result['success']:
+                status = f"\n✓ Processado com sucesso {client} - {location}"
+            else:
+                status = f"\n✗ Falha ao processar {client} - {location}"
+            
+            # Imprime status e resumo para este cliente-localização em uma única escrita
+            print(
+                status,
+                f"\nResumo para {client} - {location}:",
+                f"  Câmeras carregadas: {result['cameras_loaded']}",
+                f"  Câmeras com falha: {result['failing_cameras']}",
+                f"  Horas estimadas: {result['hours_estimated']}",
+                f"  Registros inseridos: {result['records_inserted']}",
+                f"  Registros atualizados: {result['records_updated']}",
+                sep="\n"
+            )
+            
+        except Exception as e:
+            print(f"\n✗ Erro processando {client} - {location}: {e}")
+            import traceback
+            traceback.print_exc()
+            # Adiciona resultado de erro
+            result = {
+                'client': client,
+                'location': location,
+                'success': False,
+                'error': str(e)
+            }
+        
+        return result
 
     def debug_three_cameras_failing(self):
         """Teste específico para o cenário de 3 câmeras falhando."""
@@ -1403,43 +1542,37 @@ class CameraDataImputer:
         test_cameras = [148782, 155266, 155325]
         test_hour = 15  # 15:00
         
-        print("\n" + "="*60)
-        print("DEBUG: 3 CÂMERAS FALHANDO NO MESMO HORÁRIO")
-        print("="*60)
+        # Saída acumulada e impressa de uma vez no final
+        lines = ["\n" + "="*60, "DEBUG: 3 CÂMERAS FALHANDO NO MESMO HORÁRIO", "="*60]
         
-        # Carregar dados para análise
-        self.connect()
+        # Usa os dados já carregados por load_data_for_client_location
+        flow = self.flow
         
         for camera_id in test_cameras:
-            print(f"\n{'='*40}")
-            print(f"ANÁLISE CÂMERA {camera_id}:")
-            print(f"{'='*40}")
+            lines += [f"\n{'='*40}", f"ANÁLISE CÂMERA {camera_id}:", f"{'='*40}"]
             
-            # Obter dados históricos
-            hist_data = self.flow_df[
-                (self.flow_df['camera_id'] == camera_id) &
-                (self.flow_df['hour'] == test_hour)
-            ]
+            # Registros históricos da câmera na hora analisada, direto dos arrays
+            rows = self._camera_hour_rows(camera_id, test_hour)
             
-            if len(hist_data) > 0:
-                print(f"Total registros históricos: {len(hist_data)}")
-                print(f"Média entrada: {hist_data['total_inside'].mean():.0f}")
-                print(f"Média saída: {hist_data['total_outside'].mean():.0f}")
-                print(f"Média total: {(hist_data['total_inside'] + hist_data['total_outside']).mean():.0f}")
+            if len(rows) > 0:
+                totals = flow.total[rows]
+                lines += [
+                    f"Total registros históricos: {len(rows)}",
+                    f"Média entrada: {flow.inside[rows].mean():.0f}",
+                    f"Média saída: {flow.outside[rows].mean():.0f}",
+                    f"Média total: {totals.mean():.0f}",
+                ]
                 
                 # Mostrar por dia da semana
-                for weekday in range(7):
-                    weekday_data = hist_data[hist_data['weekday'] == weekday]
-                    if len(weekday_data) > 0:
-                        avg = (weekday_data['total_inside'] + weekday_data['total_outside']).mean()
-                        print(f"  Dia {weekday}: {avg:.0f}")
+                weekdays = flow.weekday[rows]
+                counts = np.bincount(weekdays, minlength=7)
+                sums = np.bincount(weekdays, weights=totals, minlength=7)
+                lines += [f"  Dia {weekday}: {sums[weekday] / counts[weekday]:.0f}" for weekday in np.flatnonzero(counts)]
             else:
-                print("Sem dados históricos!")
+                lines.append("Sem dados históricos!")
         
         # Verificar relações entre as câmeras
-        print(f"\n{'='*40}")
-        print("RELAÇÕES ENTRE CÂMERAS:")
-        print(f"{'='*40}")
+        lines += [f"\n{'='*40}", "RELAÇÕES ENTRE CÂMERAS:", f"{'='*40}"]
         
         for i in range(len(test_cameras)):
             for j in range(i+1, len(test_cameras)):
@@ -1447,14 +1580,32 @@ class CameraDataImputer:
                 cam_b = test_cameras[j]
                 
                 ratio = self._get_hourly_ratio(cam_a, cam_b, test_hour, 0)  # Assumindo segunda-feira
-                print(f"{cam_a} -> {cam_b}: ratio = {ratio:.3f}")
-                print(f"  (Isso significa que {cam_b} tem {ratio:.1f}x o movimento de {cam_a})")
+                lines += [
+                    f"{cam_a} -> {cam_b}: ratio = {ratio:.3f}",
+                    f"  (Isso significa que {cam_b} tem {ratio:.1f}x o movimento de {cam_a})",
+                ]
         
-        self.disconnect()
+        print(*lines, sep="\n")
+
+
+def _init_worker_logging(level: int):
+    """
+    Configura o logging em um processo de trabalho. No método spawn (Windows/macOS)
+    ele começa sem handlers, e o basicConfig de main() não chega até ele.
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+def _process_one(db_path: str, client: str, location: str, days_back: int) -> Dict:
+    """Processa um par cliente-localização em um processo de trabalho, com conexão própria."""
+    with CameraDataImputer(db_path, [(client, location)]) as imputer:
+        return imputer.process_client_location(client, location, days_back)
 
 
 def main():
     """Função principal de execução."""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    
     # Configuração
     DB_PATH = "nodehub.db"  # Atualize com o caminho do seu banco de dados
     
@@ -1464,24 +1615,18 @@ def main():
         # Adicione mais conforme necessário
     ]
     
-    # Cria imputador
-    imputer = CameraDataImputer(DB_PATH, TARGET_CLIENT_LOCATIONS)
-    
     try:
-        # Executa imputação para todos clientes-localizações
-        imputer.run_imputation(
-            days_back=45  # Usa 45 dias de dados históricos
-        )
+        # Cria imputador; a conexão fica aberta durante toda a execução e é
+        # fechada ao sair do bloco
+        with CameraDataImputer(DB_PATH, TARGET_CLIENT_LOCATIONS) as imputer:
+            # Executa imputação para todos clientes-localizações
+            imputer.run_imputation(
+                days_back=45  # Usa 45 dias de dados históricos
+            )
     except Exception as e:
         print(f"\n✗ Erro fatal durante imputação: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        # Garante que conexão seja fechada
-        try:
-            imputer.disconnect()
-        except:
-            pass
 
 def debug_main():
 
@@ -1495,17 +1640,13 @@ def debug_main():
         # Adicione mais conforme necessário
     ]
 
-    # No seu main(), adicione:
-    imputer = CameraDataImputer(DB_PATH, TARGET_CLIENT_LOCATIONS)
-    imputer.connect()
-
-    # Carregar dados para um cliente-localização específico
-    imputer.load_data_for_client_location('net3rcorp', 'teste', days_back=45)
-
-    # Executar debug
-    imputer.debug_three_cameras_failing()
+    # Uma única conexão, aberta e fechada pelo bloco with
+    with CameraDataImputer(DB_PATH, TARGET_CLIENT_LOCATIONS) as imputer:
+        # Carregar dados para um cliente-localização específico
+        imputer.load_data_for_client_location('net3rcorp', 'teste', days_back=45)
 
-    imputer.disconnect()
+        # Executar debug
+        imputer.debug_three_cameras_failing()
     
 
 if __name__ == "__main__":
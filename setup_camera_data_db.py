@@ -38,6 +38,7 @@ def setup_camera_data_db():
         valid INTEGER
     );
     """)
+    cursor.execute("CREATE INDEX ix_pft_created ON peopleflowtotals(created_at, camera_id, valid)")
 
     # -----------------------------------------
     # Cria tabela login_camera